@@ -1,11 +1,12 @@
 import os
+import re
+import db
 import dotenv
 import authlib
+import metrics
 import birthday
 import requests
-import tempfile
 import streamlit as st
-import mysql.connector
 import birthday_email_notifier
 from authlib.integrations.requests_client import OAuth2Session
 
@@ -15,113 +16,155 @@ dotenv.load_dotenv()
 # Retrieve the admin email from the environment variables
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL")
 
-def get_connection():
+# How long cached admin list pages are trusted before the database is asked again
+ADMIN_LIST_TTL = 300
+
+
+# Rows per page in the admin list, and addresses per IN (...) lookup
+ADMIN_PAGE_SIZE = 50
+_LOOKUP_CHUNK = 1000
+
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def parse_email_list(text):
     """
-    Establishes and returns a secure MySQL database connection using SSL.
-    The SSL CA certificate is obtained from the 'AIVEN_CA_PEM' environment variable.
+    Split pasted or uploaded text into email addresses (one per line, or
+    separated by commas, semicolons or spaces). Addresses are lower-cased
+    and de-duplicated in order. Returns (emails, invalid).
 
-    Raises:
-        EnvironmentError: If the SSL certificate content is not provided.
-        mysql.connector.Error: If the database connection fails.
+    Args:
+        text (str): The raw text.
     """
-    # Retrieve the SSL CA certificate content from the environment variable
-    ssl_ca_content = os.getenv("AIVEN_CA_PEM")
-    if not ssl_ca_content:
-        st.error("SSL CA certificate not found in environment variable 'AIVEN_CA_PEM'")
-        raise EnvironmentError("SSL CA certificate not found in environment variable 'AIVEN_CA_PEM'")
+    emails, invalid = [], []
+    for token in dict.fromkeys(t.strip().strip('"\'').lower() for t in re.split(r"[\s,;]+", text)):
+        if not token:
+            continue
+        (emails if _EMAIL_RE.match(token) else invalid).append(token)
+    return emails, invalid
 
-    # Write the certificate content to a secure temporary file with a .pem extension
-    with tempfile.NamedTemporaryFile(delete=False, mode="w", suffix=".pem") as tmp_file:
-        tmp_file.write(ssl_ca_content)
-        ssl_ca_path = tmp_file.name
 
-    # Set file permissions to allow read access only to the file owner
-    os.chmod(ssl_ca_path, 0o600)
+def _existing_authorized_emails(emails):
+    """
+    Return which of `emails` are already on the allow-list, looked up in
+    chunks of IN (...) queries.
+    """
+    found = set()
+    for start in range(0, len(emails), _LOOKUP_CHUNK):
+        chunk = emails[start:start + _LOOKUP_CHUNK]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        rows = db.fetch_all(f"SELECT email FROM authorized_emails WHERE email IN ({placeholders})", tuple(chunk))
+        found.update(row[0].lower() for row in rows)
+    return found
 
-    try:
-        # Establish a secure connection to the MySQL database using the temporary certificate file
-        conn = mysql.connector.connect(
-            host=os.getenv("MYSQL_HOST"),
-            port=int(os.getenv("MYSQL_PORT")),
-            user=os.getenv("MYSQL_USER"),
-            password=os.getenv("MYSQL_PASSWORD"),
-            database=os.getenv("MYSQL_DATABASE"),
-            ssl_ca=ssl_ca_path,
-            ssl_verify_cert=True,
-            connection_timeout=10,
-            tls_versions=["TLSv1.2"],
-            use_pure=True
-        )
-        return conn
-    except mysql.connector.Error as e:
-        st.error(f"MySQL connection failed: {e}")
-        raise
 
-def load_authorized_emails():
+@metrics.timed("db.add_authorized_emails")
+def add_authorized_emails(emails):
     """
-    Retrieve and return the set of authorized emails from the database.
+    Add many emails to the allow-list in a single transaction and return
+    a report: {"added": [...], "skipped": [...]} (skipped = already there).
+
+    Args:
+        emails (list): Normalized addresses, e.g. from parse_email_list().
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT email FROM authorized_emails")
-    results = cursor.fetchall()
-    emails = {row[0] for row in results}
-    cursor.close()
-    conn.close()
-    return emails
+    existing = _existing_authorized_emails(emails)
+    added = [email for email in emails if email not in existing]
+    db.executemany("INSERT IGNORE INTO authorized_emails (email) VALUES (%s)", [(email,) for email in added])
+    _clear_admin_list()
+    return {"added": added, "skipped": [email for email in emails if email in existing]}
 
 
-def add_authorized_email(email):
+@metrics.timed("db.remove_authorized_emails")
+def remove_authorized_emails(emails):
     """
-    Add a new authorized email to the database.
+    Remove many emails from the allow-list in a single transaction and
+    return a report: {"removed": [...], "skipped": [...]} (skipped = not
+    on the list, or the admin email, which cannot be removed).
 
     Args:
-        email (str): The email address to add.
+        emails (list): Normalized addresses, e.g. from parse_email_list().
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT IGNORE INTO authorized_emails (email) VALUES (%s)", (email,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    admin = (ADMIN_EMAIL or "").lower()
+    existing = _existing_authorized_emails(emails)
+    removed = [email for email in emails if email in existing and email != admin]
+    db.executemany("DELETE FROM authorized_emails WHERE email = %s", [(email,) for email in removed])
+    _clear_admin_list()
+    return {"removed": removed, "skipped": [email for email in emails if email not in removed]}
 
 
-def remove_authorized_email(email):
+def _like_pattern(search):
     """
-    Remove an authorized email from the database.
+    Turn a search string into a LIKE pattern matching it anywhere.
+    """
+    escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
 
-    Args:
-        email (str): The email address to remove.
+
+@st.cache_data(ttl=ADMIN_LIST_TTL, show_spinner=False)
+@metrics.timed("db.count_authorized_emails")
+def count_authorized_emails(search=""):
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM authorized_emails WHERE email = %s", (email,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    Return the number of authorized emails containing `search`.
+    """
+    return db.fetch_one("SELECT COUNT(*) FROM authorized_emails WHERE email LIKE %s", (_like_pattern(search),))[0]
+
 
-def get_email_schedule_status(email):
+@st.cache_data(ttl=ADMIN_LIST_TTL, show_spinner=False)
+@metrics.timed("db.list_authorized_emails")
+def list_authorized_emails(search="", limit=ADMIN_PAGE_SIZE, offset=0):
     """
-    Retrieve the email scheduling status for the given user.
-    Returns True if enabled (or if no record exists, default to True).
+    Return one page of authorized emails containing `search`, in order.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT scheduling_enabled FROM email_schedule WHERE email = %s", (email,))
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    # If there's no record, default to disabled (False), i.e., opt out
-    return False if result is None else (result[0] == 1)
+    rows = db.fetch_all(
+        "SELECT email FROM authorized_emails WHERE email LIKE %s ORDER BY email LIMIT %s OFFSET %s",
+        (_like_pattern(search), limit, offset)
+    )
+    return [row[0] for row in rows]
+
+
+def _clear_admin_list():
+    """
+    Drop cached admin list pages after the allow-list changed.
+    """
+    count_authorized_emails.clear()
+    list_authorized_emails.clear()
+
 
+@metrics.timed("db.load_user_profile")
+def load_user_profile(email):
+    """
+    Fetch everything the app needs to know about one user in a single
+    query: whether they are authorized and whether daily emails are
+    enabled (no schedule record means opted out). New per-user settings
+    belong in this query too. The result is kept in the session, so
+    reruns of the dashboard do not query the database.
+
+    Args:
+        email (str): The user's email address.
+    """
+    row = db.fetch_one(
+        """
+        SELECT a.email IS NOT NULL, COALESCE(s.scheduling_enabled, 0)
+        FROM (SELECT %s AS email) AS u
+        LEFT JOIN authorized_emails a ON a.email = u.email
+        LEFT JOIN email_schedule s ON s.email = u.email
+        """,
+        (email,)
+    )
+    profile = {
+        "email": email,
+        "authorized": bool(row[0]),
+        "scheduling_enabled": row[1] == 1,
+    }
+    return profile
+
+@metrics.timed("db.set_email_schedule_status")
 def set_email_schedule_status(email, enabled):
     """
     Insert or update the email scheduling status for a user.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
     # Insert a new record or update existing one using ON DUPLICATE KEY UPDATE
-    cursor.execute(
+    db.execute(
         """
         INSERT INTO email_schedule (email, scheduling_enabled)
         VALUES (%s, %s)
@@ -129,9 +172,11 @@ def set_email_schedule_status(email, enabled):
         """,
         (email, int(enabled), int(enabled))
     )
-    conn.commit()
-    cursor.close()
-    conn.close()
+
+    # Write through to the profile kept in this session
+    profile = st.session_state.get("user_profile")
+    if profile is not None and profile["email"] == email:
+        profile["scheduling_enabled"] = bool(enabled)
 
 
 # --- Google OAuth Configuration ---
@@ -155,6 +200,8 @@ if "logged_in" not in st.session_state:
     st.session_state["logged_in"] = False
 if "page" not in st.session_state:
     st.session_state["page"] = "login"
+if "user_profile" not in st.session_state:
+    st.session_state["user_profile"] = None
 
 st.set_page_config(
     page_title="Birthday Reminder",
@@ -279,7 +326,11 @@ def fetch_user_info():
             name = user_info.get("name", "User")
             picture = user_info.get("picture", None)
 
-            if email in load_authorized_emails():
+            # Authorization and preferences come in one query and are kept
+            # for the session, so dashboard reruns need no database calls
+            profile = load_user_profile(email)
+            if profile["authorized"]:
+                st.session_state["user_profile"] = profile
                 st.session_state["logged_in_user"] = email
                 st.session_state["user_name"] = name
                 st.session_state["profile_pic"] = picture
@@ -302,32 +353,84 @@ def logout():
     st.session_state["logged_in_user"] = None
     st.session_state["user_name"] = None
     st.session_state["profile_pic"] = None
+    st.session_state["user_profile"] = None
     st.session_state["logged_in"] = False
     st.session_state["page"] = "login"
 
 
+def _show_admin_report(report):
+    """
+    Summarize the outcome of a bulk allow-list change.
+    """
+    labels = {"added": "Added", "removed": "Removed", "skipped": "Skipped", "invalid": "Invalid"}
+    summary = ", ".join(f"{labels[k]} {len(v)}" for k, v in report.items())
+    if report.get("added") or report.get("removed"):
+        st.success(summary)
+    else:
+        st.info(summary)
+    with st.expander("Details"):
+        for k, v in report.items():
+            if v:
+                st.markdown(f"**{labels[k]}** ({len(v)})")
+                st.text("\n".join(v))
+
+
 def admin_panel():
     """
-    Display the admin panel for managing authorized emails.
+    Display the admin panel for managing authorized emails: bulk add or
+    remove from pasted text or an uploaded file, and a paginated,
+    searchable list fetched one page at a time.
     """
-    authorized_emails = load_authorized_emails()
     st.markdown("## Admin: Manage Authorized Emails")
+
+    with st.form("bulk_emails_form", clear_on_submit=True):
+        pasted = st.text_area("Email addresses (one per line, or separated by commas or spaces)")
+        uploaded = st.file_uploader("...or upload a .txt/.csv file", type=["txt", "csv"])
+        col1, col2 = st.columns(2)
+        add = col1.form_submit_button("Add all")
+        remove = col2.form_submit_button("Remove all")
+
+    if add or remove:
+        text = pasted + "\n" + (uploaded.getvalue().decode("utf-8", "replace") if uploaded else "")
+        emails, invalid = parse_email_list(text)
+        report = add_authorized_emails(emails) if add else remove_authorized_emails(emails)
+        report["invalid"] = invalid
+        st.session_state["admin_report"] = report
+
+    report = st.session_state.pop("admin_report", None)
+    if report is not None:
+        _show_admin_report(report)
+
     st.write("Currently authorized emails:")
-    for email in sorted(authorized_emails):
-        st.write(email)
-        if st.button(f"Remove {email}", key=f"remove_{email}"):
-            if email == ADMIN_EMAIL:
-                st.warning("Cannot remove admin email!")
-            else:
-                remove_authorized_email(email)
-                st.success(f"Removed {email}")
-                rerun()
-    new_email = st.text_input("Add new authorized email", key="new_email_input")
-    if st.button("Add Email"):
-        if new_email:
-            add_authorized_email(new_email)
-            st.success(f"Added {new_email}")
-            rerun()
+    search = st.text_input("Search", key="admin_search").strip().lower()
+    total = count_authorized_emails(search)
+    pages = max(1, -(-total // ADMIN_PAGE_SIZE))
+    if st.session_state.get("admin_page", 1) > pages:
+        st.session_state["admin_page"] = pages
+    page = st.number_input("Page", min_value=1, max_value=pages, key="admin_page")
+    emails = list_authorized_emails(search, ADMIN_PAGE_SIZE, (page - 1) * ADMIN_PAGE_SIZE)
+
+    st.caption(f"{total} matching emails, page {page} of {pages}")
+    st.dataframe({"Email": emails}, use_container_width=True, hide_index=True)
+
+    with st.form("remove_selected_form", clear_on_submit=True):
+        selected = st.multiselect("Remove from this page", emails)
+        remove_selected = st.form_submit_button("Remove selected")
+    if remove_selected and selected:
+        st.session_state["admin_report"] = remove_authorized_emails([email.lower() for email in selected])
+        rerun()
+
+
+# Upcoming listings can cover most of the roster, so only a few slider
+# positions are kept. Today's and missed birthdays need no cache here: the
+# BirthdayCalendar already memoizes them per IST date and roster version.
+@st.cache_data(ttl=24 * 3600, max_entries=8, show_spinner=False)
+def cached_upcoming_birthdays(n, date, roster_version):
+    """
+    Next `n` birthday days after `date`, memoized across sessions.
+    `roster_version` is only part of the cache key.
+    """
+    return birthday.get_upcoming_birthdays(n, date)
 
 
 def dashboard():
@@ -338,29 +441,35 @@ def dashboard():
     user_name = st.session_state["user_name"]
     user_email = st.session_state["logged_in_user"]
 
-    tabs = st.tabs(["Today","Upcoming","Missed"])
-    with tabs[0]:
+    # Only the selected view is computed; results are shared across sessions
+    # and keyed on the IST date and roster version, so they roll over at midnight
+    today   = birthday.today_ist()
+    version = birthday.roster_version()
+    view = st.radio("View", ["Today", "Upcoming", "Missed"], horizontal=True,
+                    label_visibility="collapsed", key="dashboard_view")
+
+    if view == "Today":
         st.header("🎂 Today's Birthdays")
-        today_df = birthday.get_dataframe()
+        today_df = birthday.get_dataframe(today)
         if today_df.empty:
             st.info("No birthdays today! 🎉")
         else:
             st.dataframe(today_df, use_container_width=True)
 
-    with tabs[1]:
+    elif view == "Upcoming":
         st.header("🔜 Upcoming Birthdays")
-        count = st.slider("How many days ahead?", 1, 10, 2)
-        up_df = birthday.get_upcoming_birthdays(count)
+        count = st.slider("How many days ahead?", 1, 365, 2)
+        up_df = cached_upcoming_birthdays(count, today, version)
         if up_df.empty:
             st.info("No upcoming birthdays found.")
         else:
-            for date, grp in up_df.groupby('Birthday Date'):
+            for date, grp in up_df.groupby('Birthday Date', sort=False):
                 st.subheader(date)
                 st.table(grp.drop(columns=['Birthday Date']))
 
-    with tabs[2]:
+    else:
         st.header("⏪ Missed Birthdays")
-        miss_df = birthday.get_missed_birthdays()
+        miss_df = birthday.get_missed_birthdays(today)
         if miss_df.empty:
             st.info("No missed birthdays (yesterday).")
         else:
@@ -385,8 +494,11 @@ def dashboard():
             ''',
             unsafe_allow_html=True
         )
-        # Retrieve current email scheduling preference (default to True if not set)
-        current_status = get_email_schedule_status(user_email)
+        # Current email scheduling preference, from the profile loaded at login
+        profile = st.session_state.get("user_profile")
+        if profile is None or profile["email"] != user_email:
+            profile = st.session_state["user_profile"] = load_user_profile(user_email)
+        current_status = profile["scheduling_enabled"]
         new_status = st.checkbox("Enable Daily Email Notification", value=current_status, key="email_notification_checkbox")
         if new_status != current_status:
             set_email_schedule_status(user_email, new_status)
@@ -429,9 +541,13 @@ def dashboard():
         admin_panel()
 
 # --- Main Application Flow ---
-fetch_user_info()
+with metrics.span("page.render"):
+    fetch_user_info()
+
+    if st.session_state["page"] == "dashboard":
+        dashboard()
+    else:
+        login()
 
-if st.session_state["page"] == "dashboard":
-    dashboard()
-else:
-    login()
+if metrics.ENABLED:
+    metrics.write_text()
@@ -0,0 +1,259 @@
+"""
+Benchmark the roster pipeline on synthetic data.
+
+Generates seeded, encrypted rosters under a throwaway Fernet key (no real
+credentials needed), times decryption, the birthday queries and the email
+assembly (with Gemini and SMTP replaced by local stubs), and writes the
+results as JSON so runs from different commits can be compared.
+
+    python benchmarks/run_benchmarks.py                       # 1k and 100k rows
+    python benchmarks/run_benchmarks.py --sizes 1000000       # 1M rows (slow to generate)
+    python benchmarks/run_benchmarks.py --format csv --out before.json
+"""
+import os
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = os.path.join(ROOT, "benchmarks", ".work")
+
+SEED = 28
+BENCH_DATE = "2024-06-15"
+UPCOMING_N = [2, 30, 365]
+RECIPIENTS = 100
+
+FIRST_NAMES = ["aarav", "diya", "ishaan", "kavya", "rohan", "meera", "arjun", "ananya", "vikram", "sneha"]
+LAST_NAMES  = ["kumar", "sharma", "iyer", "reddy", "nair", "patel", "singh", "rao", "das", "menon"]
+
+
+def throwaway_key(seed: int) -> bytes:
+    """
+    Derive a deterministic Fernet key from the seed, so generated rosters
+    can be reused between runs. Never use it for real data.
+    """
+    return base64.urlsafe_b64encode(hashlib.sha256(f"benchmark-{seed}".encode()).digest())
+
+
+# The roster modules read KEY at import time, so set it first
+os.environ["KEY"] = throwaway_key(SEED).decode()
+os.environ.setdefault("MESSAGE_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "messages.sqlite3"))
+os.environ.setdefault("DIGEST_STORE_PATH", os.path.join(tempfile.mkdtemp(), "digests"))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+import birthday
+import fernet_pool
+import roster_format
+
+
+def generate_roster(n: int, seed: int) -> pd.DataFrame:
+    """
+    Build a plaintext roster with the same columns and value shapes as data-main.csv.
+    """
+    rng = random.Random(seed)
+    start = pd.Timestamp("1995-01-01").toordinal()
+    rows = []
+    for i in range(n):
+        dob = pd.Timestamp.fromordinal(start + rng.randrange(12 * 365))
+        rows.append({
+            "Name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "DOB": dob.strftime("%Y-%m-%d %H:%M:%S"),
+            "Roll No": 2100000 + i,
+            "Registration No": 210000000000 + i,
+            "Gender": rng.choice(["Male", "Female"]),
+            "Section": rng.choice("ABCDEFGH"),
+            "Email ID": f"student{i}@example.edu",
+            "Contact No.": float(9000000000 + rng.randrange(999999999)),
+            "Hosteller Or Day Scholar": rng.choice(["Hosteller", "Day Scholar"]),
+        })
+    return pd.DataFrame(rows)
+
+
+def prepare(n: int, fmt: str, seed: int) -> str:
+    """
+    Create (or reuse) the working directory holding an encrypted roster of
+    `n` rows in format `fmt` ("csv" or "bin") and return its path.
+    """
+    path = os.path.join(WORK_DIR, f"{fmt}-{n}-{seed}")
+    target = os.path.join(path, roster_format.LEGACY_CSV if fmt == "csv" else roster_format.BLOCK_FILE)
+    if not os.path.exists(target):
+        os.makedirs(path, exist_ok=True)
+        print(f"Generating {n} rows ({fmt}) ...", flush=True)
+        df = generate_roster(n, seed)
+        key = throwaway_key(seed)
+        if fmt == "csv":
+            fernet_pool.encrypt_frame(df, key).to_csv(target, index=False)
+        else:
+            roster_format.write_blocks(df, target, key)
+    return path
+
+
+def timed(func, repeat: int, setup=None) -> list:
+    """
+    Run `func` `repeat` times (calling `setup` before each run, untimed)
+    and return the wall-clock seconds of each run.
+    """
+    out = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        out.append(time.perf_counter() - start)
+    return out
+
+
+class _StubModel:
+    """
+    Stands in for the Gemini model: returns a fixed message immediately.
+    """
+
+    class _Response:
+        text = "Happy birthday! Wishing you a wonderful year ahead.\nBest,\nBenchmark"
+
+    def generate_content(self, prompt):
+        return self._Response()
+
+
+class _NullSession:
+    """
+    Stands in for an SMTP session: serializes the message and drops it.
+    """
+
+    def send(self, msg, to_addrs=None):
+        msg.as_string()
+
+
+def load_notifier():
+    """
+    Import the email module with Gemini stubbed out, or return None if its
+    dependencies are not installed.
+    """
+    try:
+        import birthday_email_notifier
+    except ImportError as e:
+        print(f"Skipping email benchmarks: {e}")
+        return None
+    birthday_email_notifier.model = _StubModel()
+    return birthday_email_notifier
+
+
+def bench_size(n: int, fmt: str, seed: int, repeat: int, notifier) -> list:
+    """
+    Run every benchmark against one roster and return the result records.
+    """
+    os.chdir(prepare(n, fmt, seed))
+    date = pd.Timestamp(BENCH_DATE)
+    results = []
+
+    def record(op, seconds, **extra):
+        results.append({
+            "rows": n, "format": fmt, "op": op, **extra,
+            "seconds": seconds, "min": min(seconds), "median": statistics.median(seconds),
+        })
+        size = f"  {extra['bytes']} B/msg" if 'bytes' in extra else ""
+        print(f"{fmt:>3} {n:>8} {op:<28} {str(extra.get('n', '')):>4} min {min(seconds) * 1000:10.2f} ms{size}", flush=True)
+
+    cold = birthday._roster_cache.clear
+    record("load_roster", timed(birthday._load_roster, repeat, setup=cold))
+    if n <= 100_000:
+        record("_load_decrypted_df", timed(birthday._load_decrypted_df, repeat, setup=cold))
+
+    # Queries on a loaded roster. Cold runs also drop the decrypted rows the
+    # roster keeps, so they include the lazy decryption of the returned rows;
+    # warm runs (calendar memo dropped only) reuse the rows of the run before.
+    roster = birthday._load_roster()
+
+    def fresh():
+        birthday._calendars.clear()
+
+    def cold_rows():
+        fresh()
+        roster._rows.clear()
+        getattr(roster.source, '_blocks', {}).clear()
+
+    queries = [("get_dataframe", None, lambda: birthday.get_dataframe(date)),
+               ("get_missed_birthdays", None, lambda: birthday.get_missed_birthdays(date))]
+    queries += [("get_upcoming_birthdays", k, lambda k=k: birthday.get_upcoming_birthdays(k, date)) for k in UPCOMING_N]
+    for op, k, query in queries:
+        extra = {} if k is None else {"n": k}
+        record(op, timed(query, repeat, setup=cold_rows), **extra)
+        record(f"{op} (warm)", timed(query, repeat, setup=fresh), **extra)
+
+    if notifier is not None:
+        record("build_digest", timed(lambda: notifier.build_digest("Benchmark"), repeat, setup=cold_rows))
+        notifier.get_digest("Benchmark")
+        record("get_digest (stored)", timed(lambda: notifier.get_digest("Benchmark"), repeat, setup=cold))
+
+        # Per-recipient cost: address and serialize one digest for many people
+        digest = notifier.build_digest("Benchmark")
+        if digest is not None:
+            payload = notifier.make_message(digest, "someone@example.edu").as_string()
+            record("encode per recipient", timed(
+                lambda: [notifier.make_message(digest, f"r{i}@example.edu").as_string() for i in range(RECIPIENTS)],
+                repeat,
+            ), n=RECIPIENTS, bytes=len(payload))
+        record("send_email (stub SMTP)", timed(
+            lambda: notifier.send_email("Benchmark", "someone@example.edu", session=_NullSession()), repeat, setup=fresh
+        ))
+    return results
+
+
+def git_commit() -> str:
+    """
+    Return the current commit hash, or None outside a git checkout.
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000], help="roster sizes to benchmark")
+    parser.add_argument("--format", choices=["csv", "bin"], nargs="+", default=["csv", "bin"], help="roster formats")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed for the synthetic roster")
+    parser.add_argument("--out", default=os.path.join(ROOT, "benchmarks", "results.json"), help="JSON output file")
+    args = parser.parse_args()
+    args.out = os.path.abspath(args.out)
+
+    if args.seed != SEED:
+        os.environ["KEY"] = throwaway_key(args.seed).decode()
+        birthday.KEY = os.environ["KEY"]
+
+    notifier = load_notifier()
+    results = []
+    for fmt in args.format:
+        for n in args.sizes:
+            results.extend(bench_size(n, fmt, args.seed, args.repeat, notifier))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": pd.Timestamp.now(tz="UTC").isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "cpus": os.cpu_count(),
+        "fernet_workers": fernet_pool.WORKERS,
+        "seed": args.seed,
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
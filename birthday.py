@@ -1,110 +1,512 @@
 import os
 import pytz
 import dotenv
+import calendar
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-from cryptography.fernet import Fernet
-from functools import lru_cache
+import metrics
+import fernet_pool
+import roster_format
 
-# Load your Fernet key
+# Load your Fernet key. While a key is being rotated, KEY holds "NEW,OLD"
+# and tokens under either key are accepted.
 dotenv.load_dotenv()
-KEY = os.getenv('KEY')
-cipher = Fernet(KEY)
+KEY = fernet_pool.parse_keys(os.getenv('KEY'))
+cipher = fernet_pool.make_cipher(KEY)
 
 
-@lru_cache(maxsize=1)
-def _load_decrypted_df() -> pd.DataFrame:
+def _day_key(month, day):
+    """
+    Encode a (month, day) pair as a single sortable integer.
+    Works element-wise on numpy arrays as well as on plain ints.
+    """
+    return month * 32 + day
+
+
+_FEB_28 = _day_key(2, 28)
+_FEB_29 = _day_key(2, 29)
+_NO_ROWS = np.empty(0, dtype=np.intp)
+
+
+# Compact dtypes applied when the whole roster is materialized. Integer
+# columns that do not parse cleanly (e.g. alphanumeric roll numbers) stay strings.
+_CATEGORY_COLUMNS = ['Section', 'Gender', 'Hosteller Or Day Scholar']
+_INTEGER_COLUMNS  = ['Roll No', 'Registration No', 'Contact No.']
+
+# Single-day results kept per BirthdayCalendar (least recently used are dropped)
+_MAX_RESULTS = 4
+
+# Decrypted rows kept by a loaded roster (least recently used are dropped),
+# so repeated queries skip decryption without the memo growing into a full
+# decrypted copy of the roster
+_MAX_CACHED_ROWS = 4096
+
+
+def _parse_dob_days(values) -> np.ndarray:
+    """
+    Parse DOB strings into an int32 array of days since 1970-01-01.
+    """
+    dob = pd.to_datetime(pd.Series(values, dtype=object), format='%Y-%m-%d %H:%M:%S')
+    return dob.to_numpy().astype('datetime64[D]').astype(np.int32)
+
+
+def _format_dob(days: np.ndarray) -> np.ndarray:
     """
-    Read the encrypted CSV once, decrypt every cell, parse DOB column,
-    and cache the result for future calls.
+    Format day ordinals as dd-mm-YYYY strings (used on returned rows only).
     """
-    enc = pd.read_csv("data-encrypted.csv")
-    df = enc.apply(lambda col: col.map(lambda x: cipher.decrypt(x.encode()).decode()))
+    return pd.DatetimeIndex(days.astype('datetime64[D]')).strftime('%d-%m-%Y').to_numpy()
 
-    df['DOB'] = pd.to_datetime(df['DOB'], format='%Y-%m-%d %H:%M:%S')
+
+def _compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert low-cardinality columns to categoricals and numeric-like
+    columns to int64, in place, and return the frame.
+    """
+    for col in _CATEGORY_COLUMNS:
+        if col in df:
+            df[col] = df[col].astype('category')
+    for col in _INTEGER_COLUMNS:
+        if col in df:
+            nums = pd.to_numeric(df[col], errors='coerce')
+            if nums.notna().all() and (nums % 1 == 0).all():
+                df[col] = nums.astype(np.int64)
     return df
 
 
-def get_dataframe() -> pd.DataFrame:
+def _dob_day_keys(dob_days: np.ndarray) -> np.ndarray:
     """
-    Return a DataFrame of people whose birthday is today.
+    Return the (month, day) key of each DOB day ordinal.
     """
-    df = _load_decrypted_df().copy()
+    dates  = dob_days.astype('datetime64[D]')
+    months = dates.astype('datetime64[M]')
+    return _day_key(months.astype(np.int64) % 12 + 1, (dates - months).astype(np.int64) + 1)
 
-    df['Name']            = df['Name'].str.title()
-    df['Contact No.']     = df['Contact No.'].str[:-2]
-    df['Roll No']         = df['Roll No'].astype(str)
-    df['Registration No'] = df['Registration No'].astype(str)
 
-    today = pd.Timestamp.now(pytz.timezone('Asia/Kolkata')).normalize().tz_localize(None)
-    # today = today.replace(day=28, month=6) # if we want to change today's date
+class _DayIndexBuilder:
+    """
+    Builds the DOB arrays and the day index incrementally from chunks of
+    decrypted DOB strings, so a roster can be indexed while it streams in
+    without ever holding all of its decrypted strings at once.
+    """
 
-    mask = (df['DOB'].dt.month == today.month) & (df['DOB'].dt.day == today.day)
-    today_df = df.loc[mask].copy()
+    def __init__(self, n_rows: int):
+        self.dob_days = np.empty(n_rows, dtype=np.int32)
+        self.keys     = np.empty(n_rows, dtype=np.int16)
+        self.filled   = 0
 
-    if today_df.empty:
-        return pd.DataFrame()
+    def add(self, values: list):
+        """
+        Parse one chunk of DOB strings (the next rows of the roster).
+        """
+        days = _parse_dob_days(values)
+        end  = self.filled + len(days)
+        self.dob_days[self.filled:end] = days
+        self.keys[self.filled:end]     = _dob_day_keys(days)
+        self.filled = end
 
-    # Compute age and reformat DOB
-    today_df['Age'] = today.year - today_df['DOB'].dt.year
-    today_df['DOB'] = today_df['DOB'].dt.strftime('%d-%m-%Y')
+    def finish(self) -> dict:
+        """
+        Bucket the row positions of the roster by the (month, day) of their
+        DOB, so date lookups only touch the matching rows.
+        """
+        if self.filled != len(self.dob_days):
+            raise ValueError(f"Roster ended after {self.filled} of {len(self.dob_days)} rows")
+        order = np.argsort(self.keys, kind='stable')
+        uniq, starts = np.unique(self.keys[order], return_index=True)
+        return dict(zip(uniq.tolist(), np.split(order, starts[1:])))
 
-    cols = [
-        'Name','DOB','Age','Section','Contact No.','Roll No',
-        'Registration No','Gender','Hosteller Or Day Scholar','Email ID'
-    ]
-    return today_df[cols].reset_index(drop=True)
 
+class _LazyRoster:
+    """
+    Encrypted roster that decrypts the DOB column up front and every other
+    column only for the rows a query actually returns. The most recently
+    returned rows (up to _MAX_CACHED_ROWS) are kept decrypted.
 
-def get_upcoming_birthdays(n: int = 2) -> pd.DataFrame:
+    The day index and the sorted array of distinct day keys are built once,
+    when the roster is loaded, from the DOB column streamed chunk by chunk.
+    DOB is kept as an int32 day ordinal (plus an int16 birth year); display
+    strings are only built for returned rows.
     """
-    Return a DataFrame of the next `n` distinct future days (1–365)
-    that have birthdays, listing all birthdays on each such day.
+
+    def __init__(self, source, version: str = None):
+        self.source  = source
+        self.version = version
+        self.columns = list(source.columns)
+        self.others  = [c for c in self.columns if c != 'DOB']
+
+        builder = _DayIndexBuilder(len(source))
+        for chunk in source.iter_column('DOB'):
+            builder.add(chunk)
+        self.index    = builder.finish()
+        self.dob_days = builder.dob_days
+        self.dob_year = (self.dob_days.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int16) + 1970)
+        # Treated as circular: the entry after the last one is the first one of the following year
+        self.keys    = np.array(sorted(self.index), dtype=np.int64)
+        self._rows   = OrderedDict()  # row position -> decrypted values of `self.others`, LRU order
+        self._lock   = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def take(self, pos) -> pd.DataFrame:
+        """
+        Return the fully decrypted rows at positions `pos`, in that order.
+        """
+        pos    = np.asarray(pos, dtype=np.intp)
+        wanted = list(dict.fromkeys(pos.tolist()))
+
+        with self._lock:
+            found = {p: self._rows[p] for p in wanted if p in self._rows}
+            for p in found:
+                self._rows.move_to_end(p)
+
+        missing = [p for p in wanted if p not in found]
+        if missing:
+            found.update(zip(missing, self.source.rows(missing, self.others)))
+            with self._lock:
+                for p in missing[-_MAX_CACHED_ROWS:]:
+                    self._rows[p] = found[p]
+                while len(self._rows) > _MAX_CACHED_ROWS:
+                    self._rows.popitem(last=False)
+
+        df = pd.DataFrame([found[p] for p in pos.tolist()], columns=self.others, index=pos)
+        df.insert(self.columns.index('DOB'), 'DOB', self.dob_days[pos].astype('datetime64[D]').astype('datetime64[ns]'))
+        return df
+
+
+class _RosterCache:
     """
-    df = _load_decrypted_df().copy()
+    Process-wide cache of the decrypted roster, shared by every Streamlit
+    session of the server.
+
+    Each lookup stats the roster file; when its mtime or size changed the
+    content is hashed, and the roster is reloaded only if the hash differs.
+    A lock makes concurrent callers wait for a single load instead of
+    decrypting the same file in parallel.
+    """
+
+    def __init__(self):
+        self._lock   = threading.Lock()
+        self._roster = None
+        self._stat   = None
+        self.stats   = {'hits': 0, 'misses': 0, 'reloads': 0}
+
+    def get(self) -> _LazyRoster:
+        path = roster_format.roster_path()
+        st   = os.stat(path)
+        stat = (path, st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            if self._roster is not None and stat == self._stat:
+                self.stats['hits'] += 1
+                return self._roster
+
+            version = roster_format.file_digest(path)
+
+            if self._roster is not None and version == self._roster.version:
+                # Touched but unchanged: keep the decrypted roster
+                self._stat = stat
+                self.stats['hits'] += 1
+                return self._roster
+
+            self.stats['reloads' if self._roster is not None else 'misses'] += 1
+            with metrics.span('roster.load'):
+                self._roster = _LazyRoster(roster_format.open_roster(KEY), version)
+            self._stat   = stat
+            return self._roster
+
+    def clear(self):
+        with self._lock:
+            self._roster = None
+            self._stat   = None
+
+
+_roster_cache = _RosterCache()
 
-    today = pd.Timestamp.now(pytz.timezone('Asia/Kolkata')).normalize().tz_localize(None)
 
-    df['this_bday'] = df['DOB'].apply(lambda dt: dt.replace(year=today.year))
+def _load_roster() -> _LazyRoster:
+    """
+    Return the current roster, reloading it if the file on disk changed.
+    """
+    return _roster_cache.get()
 
-    passed = df['this_bday'] < today
-    df.loc[passed, 'this_bday'] = df.loc[passed, 'this_bday'] + pd.DateOffset(years=1)
 
-    df['delta'] = (df['this_bday'] - today).dt.days
+def roster_version() -> str:
+    """
+    Return the content hash of the roster currently in use.
+    """
+    return _load_roster().version
 
-    up = df[df['delta'] > 0].sort_values('delta')
 
-    upcoming_deltas = up['delta'].unique()[:n]
-    sel = up[up['delta'].isin(upcoming_deltas)].copy()
+def roster_cache_stats() -> dict:
+    """
+    Return the hit/miss/reload counters of the roster cache.
+    """
+    return dict(_roster_cache.stats)
 
-    # Format for display
-    sel['Birthday Date'] = sel['this_bday'].dt.strftime('%d-%m-%Y')
-    sel['Age on Day']    = sel['this_bday'].dt.year - sel['DOB'].dt.year
-    sel['DOB']           = sel['DOB'].dt.strftime('%d-%m-%Y')
 
-    return sel[[
-        'Birthday Date','Name','DOB','Age on Day','Section','Email ID'
-    ]].reset_index(drop=True)
+def _load_decrypted_df() -> pd.DataFrame:
+    """
+    Decrypt every cell of the roster and return it as a DataFrame with a
+    parsed DOB column and compact dtypes. Queries should go through
+    `get_calendar`, which only decrypts the rows they return.
+    """
+    roster = _load_roster()
+    return _compact_frame(roster.take(np.arange(len(roster))))
 
 
-def get_missed_birthdays() -> pd.DataFrame:
+def today_ist() -> pd.Timestamp:
     """
-    Return a DataFrame of people whose birthday was exactly yesterday.
+    Return today's date (midnight, tz-naive) in Asia/Kolkata.
     """
-    df = _load_decrypted_df().copy()
+    return pd.Timestamp.now(pytz.timezone('Asia/Kolkata')).normalize().tz_localize(None)
 
-    today     = pd.Timestamp.now(pytz.timezone('Asia/Kolkata')).normalize().tz_localize(None)
-    yesterday = today - pd.Timedelta(days=1)
 
-    mask = (df['DOB'].dt.month == yesterday.month) & (df['DOB'].dt.day == yesterday.day)
-    miss = df.loc[mask].copy()
+def _positions_on(roster: _LazyRoster, date) -> np.ndarray:
+    """
+    Return the roster row positions whose birthday falls on `date`.
 
-    if miss.empty:
-        return pd.DataFrame()
+    People born on Feb 29 are observed on Feb 28 in non-leap years.
+    """
+    key = _day_key(date.month, date.day)
+    pos = roster.index.get(key, _NO_ROWS)
 
-    miss['Missed Date']   = yesterday.strftime('%d-%m-%Y')
-    miss['Age on Missed'] = yesterday.year - miss['DOB'].dt.year
-    miss['DOB']           = miss['DOB'].dt.strftime('%d-%m-%Y')
+    if key == _FEB_28 and not calendar.isleap(date.year):
+        pos = np.sort(np.concatenate([pos, roster.index.get(_FEB_29, _NO_ROWS)]))
+    return pos
+
+
+def _upcoming_dates(roster: _LazyRoster, today: pd.Timestamp, n: int) -> list:
+    """
+    Return the next `n` distinct dates after `today` (within one year)
+    on which someone has a birthday.
 
-    return miss[[
-        'Missed Date','Name','DOB','Age on Missed','Section','Email ID'
-    ]].reset_index(drop=True)
+    Binary search finds the first key after today, then the circular key
+    array is walked until `n` dates are collected, so the cost is
+    O(log N + n) regardless of the roster size.
+    """
+    keys = roster.keys
+    if n <= 0 or not len(keys):
+        return []
+
+    today_key = _day_key(today.month, today.day)
+    start = int(np.searchsorted(keys, today_key, side='right'))
+
+    dates = []
+    for i in range(start, start + len(keys)):
+        key = int(keys[i % len(keys)])
+        if key == today_key:
+            continue
+
+        year = today.year + (i >= len(keys))
+        month, day = divmod(key, 32)
+        if key == _FEB_29 and not calendar.isleap(year):
+            day = 28
+        date = pd.Timestamp(year, month, day)
+
+        # Feb 29 folds into Feb 28 in non-leap years, which may be today or already listed
+        if date <= today or (dates and dates[-1] == date):
+            continue
+
+        dates.append(date)
+        if len(dates) == n:
+            break
+    return dates
+
+
+def _dates_between(roster: _LazyRoster, start: pd.Timestamp, end: pd.Timestamp) -> list:
+    """
+    Return every date in [start, end] on which someone has a birthday,
+    by slicing the sorted day keys of each year in the range.
+    """
+    dates = []
+    for year in range(start.year, end.year + 1):
+        leap = calendar.isleap(year)
+        lo = _day_key(start.month, start.day) if year == start.year else 0
+        hi = _day_key(end.month, end.day) if year == end.year else _day_key(12, 31)
+        if hi == _FEB_28 and not leap:
+            hi = _FEB_29  # Feb 29 birthdays are observed on Feb 28
+
+        keys = roster.keys[np.searchsorted(roster.keys, lo):np.searchsorted(roster.keys, hi, side='right')]
+        for key in keys.tolist():
+            month, day = divmod(key, 32)
+            if key == _FEB_29 and not leap:
+                day = 28
+            date = pd.Timestamp(year, month, day)
+            if not dates or dates[-1] != date:
+                dates.append(date)
+    return dates
+
+
+class BirthdayCalendar:
+    """
+    Birthday queries for one roster snapshot as seen on one date.
+
+    Every query works off the roster's day index and its shared DOB ordinal
+    and birth year columns, and only materializes the rows it returns.
+    The single-day results (birthdays_on, todays, missed) are memoized on
+    the calendar, a few at a time, so those frames are shared and should
+    not be modified in place. Range listings (upcoming, between) can cover
+    most of the roster and are built on every call; callers that repeat
+    them cache what they need.
+    """
+
+    def __init__(self, roster: _LazyRoster, today: pd.Timestamp):
+        self.roster    = roster
+        self.today     = pd.Timestamp(today).normalize()
+        self.yesterday = self.today - pd.Timedelta(days=1)
+        self._results  = OrderedDict()  # LRU order
+        self._lock     = threading.Lock()
+
+    def _memo(self, key, build):
+        with self._lock:
+            if key not in self._results:
+                self._results[key] = build()
+                while len(self._results) > _MAX_RESULTS:
+                    self._results.popitem(last=False)
+            self._results.move_to_end(key)
+            return self._results[key]
+
+    def _dated_rows(self, dates: list):
+        """
+        Return (rows, birthday date per row, positions) for all birthdays on `dates`.
+        """
+        pos  = [_positions_on(self.roster, date) for date in dates]
+        flat = np.concatenate([_NO_ROWS, *pos])
+        when = pd.DatetimeIndex(np.repeat(np.array(dates, dtype='datetime64[ns]'), [len(p) for p in pos]))
+        return self.roster.take(flat), when, flat
+
+    def birthdays_on(self, date: pd.Timestamp) -> pd.DataFrame:
+        """
+        Return a DataFrame of people whose birthday falls on `date`,
+        with every roster column for display.
+        """
+        date = pd.Timestamp(date).normalize()
+
+        def build():
+            rows, _, pos = self._dated_rows([date])
+            if rows.empty:
+                return pd.DataFrame()
+
+            rows['Name']            = rows['Name'].str.title()
+            rows['Contact No.']     = rows['Contact No.'].str[:-2]
+            rows['Roll No']         = rows['Roll No'].astype(str)
+            rows['Registration No'] = rows['Registration No'].astype(str)
+
+            # Compute age and reformat DOB
+            rows['Age'] = date.year - self.roster.dob_year[pos].astype(np.int32)
+            rows['DOB'] = _format_dob(self.roster.dob_days[pos])
+
+            cols = [
+                'Name','DOB','Age','Section','Contact No.','Roll No',
+                'Registration No','Gender','Hosteller Or Day Scholar','Email ID'
+            ]
+            return rows[cols].reset_index(drop=True)
+
+        return self._memo(('on', date), build)
+
+    def todays(self) -> pd.DataFrame:
+        """
+        Return today's birthdays.
+        """
+        return self.birthdays_on(self.today)
+
+    def missed(self) -> pd.DataFrame:
+        """
+        Return the people whose birthday was exactly yesterday.
+        """
+        def build():
+            rows, _, pos = self._dated_rows([self.yesterday])
+            if rows.empty:
+                return pd.DataFrame()
+
+            rows['Missed Date']   = self.yesterday.strftime('%d-%m-%Y')
+            rows['Age on Missed'] = self.yesterday.year - self.roster.dob_year[pos].astype(np.int32)
+            rows['DOB']           = _format_dob(self.roster.dob_days[pos])
+
+            return rows[[
+                'Missed Date','Name','DOB','Age on Missed','Section','Email ID'
+            ]].reset_index(drop=True)
+
+        return self._memo(('missed',), build)
+
+    def _listing(self, dates: list) -> pd.DataFrame:
+        """
+        Format the birthdays on `dates` as an upcoming-style listing.
+        """
+        rows, when, pos = self._dated_rows(dates)
+
+        # Format for display
+        rows['Birthday Date'] = when.strftime('%d-%m-%Y')
+        rows['Age on Day']    = when.year - self.roster.dob_year[pos].astype(np.int32)
+        rows['DOB']           = _format_dob(self.roster.dob_days[pos])
+
+        return rows[[
+            'Birthday Date','Name','DOB','Age on Day','Section','Email ID'
+        ]].reset_index(drop=True)
+
+    def upcoming(self, n: int = 2) -> pd.DataFrame:
+        """
+        Return the birthdays on the next `n` distinct future days (1–365)
+        that have any.
+        """
+        return self._listing(_upcoming_dates(self.roster, self.today, n))
+
+    def between(self, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+        """
+        Return every birthday from `start` to `end` (inclusive), in date order.
+        """
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        return self._listing(_dates_between(self.roster, start, end))
+
+
+_calendars = OrderedDict()  # (roster version, date) -> BirthdayCalendar
+_calendars_lock = threading.Lock()
+_MAX_CALENDARS = 8
+
+
+def get_calendar(date: pd.Timestamp = None) -> BirthdayCalendar:
+    """
+    Return the BirthdayCalendar for the current roster as seen on `date`
+    (today in IST by default), building it at most once per
+    (roster version, date).
+    """
+    roster = _load_roster()
+    today  = today_ist() if date is None else pd.Timestamp(date).normalize()
+    key    = (roster.version, today)
+
+    with _calendars_lock:
+        cal = _calendars.get(key)
+        if cal is None or cal.roster is not roster:
+            cal = _calendars[key] = BirthdayCalendar(roster, today)
+        _calendars.move_to_end(key)
+        while len(_calendars) > _MAX_CALENDARS:
+            _calendars.popitem(last=False)
+        return cal
+
+
+def get_dataframe(date: pd.Timestamp = None) -> pd.DataFrame:
+    """
+    Return a DataFrame of people whose birthday is today
+    (or on `date`, if given).
+    """
+    return get_calendar(date).todays()
+
+
+def get_upcoming_birthdays(n: int = 2, date: pd.Timestamp = None) -> pd.DataFrame:
+    """
+    Return a DataFrame of the next `n` distinct future days (1–365)
+    that have birthdays, listing all birthdays on each such day.
+    Days are counted from today, or from `date` if given.
+    """
+    return get_calendar(date).upcoming(n)
+
+
+def get_missed_birthdays(date: pd.Timestamp = None) -> pd.DataFrame:
+    """
+    Return a DataFrame of people whose birthday was exactly yesterday
+    (the day before `date`, if given).
+    """
+    return get_calendar(date).missed()
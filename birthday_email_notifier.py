@@ -1,12 +1,16 @@
 import os
 import pytz
 import dotenv
-import smtplib
+import mailer
+import metrics
 import birthday
+import pandas as pd
+import digest_store
+import message_cache
+import roster_format
+import email_template
 from datetime import datetime
 import google.generativeai as genai
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 
 # Load environment variables from .env file
 dotenv.load_dotenv()
@@ -15,19 +19,29 @@ dotenv.load_dotenv()
 genai.configure(api_key=os.getenv('API'))
 model = genai.GenerativeModel("gemini-2.0-flash-exp")
 
-def get_birthday_message(dob, sender: str):
+def _ist_today() -> str:
+    """
+    Return today's IST date as dd-mm-YYYY.
+    """
+    return datetime.now(pytz.timezone('Asia/Kolkata')).replace(tzinfo=None).strftime("%d-%m-%Y")
+
+@metrics.timed("gemini.generate")
+def get_birthday_message(dob, sender: str, date: str = None):
     """
     Generate a personalized birthday message using generative AI.
 
     Parameters:
     - dob: Date of birth details used for age calculation.
     - sender: The sender's name to be included in the message.
+    - date: Date (dd-mm-YYYY) the message is written for; defaults to today in IST.
     """
+    date = date or _ist_today()
+
     # Prepare prompt with required details for message generation
     prompt = f"""
 You are a skilled birthday message writer. Your task is to generate a personalized birthday message that is completely self-contained and ready to be sent directly. The message should be warm, heartfelt, and sincere, incorporating the following details:
 - Name: Use a placeholder here
-- Date of Birth: {dob} (Calculate age from this date. Today's date {datetime.now(pytz.timezone('Asia/Kolkata')).replace(tzinfo=None).strftime("%d-%m-%Y")})
+- Date of Birth: {dob} (Calculate age from this date. Today's date {date})
 - Relationship: My college college friend
 
 The message should include:
@@ -48,167 +62,131 @@ Please ensure that the final message is personalized based on these details and
     response = model.generate_content(prompt)
     return response.text
 
-def send_email(sender_name: str, receiver_email: str):
+def get_cached_birthday_message(dobs: list, sender: str, date: str = None):
     """
-    Compose and send an email containing a birthday notification and personalized wishes.
+    Return the birthday message for these DOBs, generating it only if the
+    on-disk cache has no entry for (date, DOB set, sender).
+
+    Parameters:
+    - dobs: DOB strings of the people celebrating.
+    - sender: The sender's name to be included in the message.
+    - date: Date (dd-mm-YYYY) the message is written for; defaults to today in IST.
+    """
+    date = date or _ist_today()
+    key = message_cache.make_key(date, dobs, sender)
+
+    message = message_cache.get(key)
+    if message is None:
+        message = get_birthday_message(' and '.join(dobs), sender=sender, date=date)
+        message_cache.put(key, message)
+    return message
+
+def pregenerate_messages(sender_name: str, days: int = 1):
+    """
+    Fill the message cache for the next `days` days ahead of time, so the
+    emails sent on those days do not wait on Gemini.
 
     Parameters:
     - sender_name: Name to be used in the personalized message.
-    - receiver_email: Recipient's email address.
+    - days: How many days after today to prepare.
     """
-    # Retrieve birthday data and convert it to an HTML table
-    df = birthday.get_dataframe()
-    if df.empty: return False
-    df_html = df.to_html(index=False, classes='birthday-table')
-
-    # Concatenate all DOB entries and generate the birthday message
-    dob = ' and '.join(df['DOB'].to_list())
-    response_text = get_birthday_message(dob, sender=sender_name)
-
-    # Replace newline characters with HTML line breaks for proper formatting
-    message_text = response_text.replace("\n", "<br>")
-
-    # Define the HTML content for the email with inline CSS for styling
-    html = f"""
-<html>
-<head>
-    <meta charset="UTF-8">
-    <title>Birthday Celebration Notification</title>
-    <style>
-        /* Keyframe animations */
-        @keyframes fadeIn {{
-            0% {{ opacity: 0; }}
-            100% {{ opacity: 1; }}
-        }}
-        @keyframes slideIn {{
-            0% {{ transform: translateY(-20px); opacity: 0; }}
-            100% {{ transform: translateY(0); opacity: 1; }}
-        }}
-        body {{
-            font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif;
-            background: linear-gradient(135deg, #E0EAFC, #CFDEF3);
-            margin: 0;
-            padding: 20px;
-            animation: fadeIn 2s ease-in-out;
-        }}
-        .container {{
-            max-width: 650px;
-            margin: auto;
-            background: #ffffff;
-            border-radius: 10px;
-            box-shadow: 0 8px 20px rgba(0, 0, 0, 0.1);
-            overflow: hidden;
-            animation: slideIn 1s ease-out;
-        }}
-        .header {{
-            background: linear-gradient(135deg, #667eea, #764ba2);
-            color: #fff;
-            text-align: center;
-            padding: 40px 20px;
-        }}
-        .header h1 {{
-            margin: 0;
-            font-size: 32px;
-            letter-spacing: 1px;
-        }}
-        .content {{
-            padding: 30px;
-        }}
-        h2 {{
-            color: #333;
-            font-size: 24px;
-            border-bottom: 2px solid #ddd;
-            padding-bottom: 5px;
-            margin-bottom: 20px;
-        }}
-        /* Container for the DataFrame table to allow horizontal scrolling */
-        .table-container {{
-            overflow-x: auto;
-            margin-bottom: 30px;
-        }}
-        .birthday-table {{
-            width: 100%;
-            border-collapse: collapse;
-            min-width: 900px; /* Adjust this value if needed */
-        }}
-        .birthday-table th, .birthday-table td {{
-            border: 1px solid #ccc;
-            padding: 12px;
-            text-align: center;
-            transition: background-color 0.3s ease;
-        }}
-        .birthday-table th {{
-            background-color: #f7f7f7;
-            font-weight: bold;
-        }}
-        .birthday-table tr:nth-child(even) {{
-            background-color: #fefefe;
-        }}
-        .birthday-table tr:hover {{
-            background-color: #f1f1f1;
-        }}
-        .message {{
-            background-color: #e8f4fd;
-            border-left: 6px solid #3498db;
-            padding: 20px;
-            border-radius: 5px;
-            font-size: 18px;
-            line-height: 1.6;
-            color: #2c3e50;
-            margin-bottom: 30px;
-        }}
-        .footer {{
-            background-color: #f7f7f7;
-            text-align: center;
-            padding: 20px;
-            font-size: 14px;
-            color: #777;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>Birthday Celebration Notification</h1>
-        </div>
-        <div class="content">
-            <h2>Today's Birthday Celebrations</h2>
-            <div class="table-container">
-                {df_html}
-            </div>
-            <h2>Birthday Wishes</h2>
-            <div class="message">
-                {message_text}
-            </div>
-        </div>
-        <div class="footer">
-            &copy; 2025 Birthday Celebrations. Confidential and Proprietary. All rights reserved.<br>
-            This email and its contents are intended solely for the designated recipient. If you have received this email in error, please notify the sender immediately and delete it from your system.
-        </div>
-    </div>
-</body>
-</html>
-"""
+    today = pd.Timestamp(datetime.now(pytz.timezone('Asia/Kolkata')).date())
+    for offset in range(1, days + 1):
+        date = today + pd.Timedelta(days=offset)
+        df = birthday.get_dataframe(date)
+        if not df.empty:
+            get_cached_birthday_message(df['DOB'].to_list(), sender_name, date.strftime("%d-%m-%Y"))
+
+@metrics.timed("email.build_digest")
+def build_digest(sender_name: str, date: pd.Timestamp = None):
+    """
+    Render the birthday notification for `date` (default: today in IST),
+    including the personalized wishes, as an email_template.Digest. The
+    digest is the same for every recipient, so it is built once per run.
+    Returns None when there are no birthdays that day.
+
+    Parameters:
+    - sender_name: Name to be used in the personalized message.
+    - date: Day to build the digest for.
+    """
+    date = birthday.today_ist() if date is None else date
+
+    # Retrieve birthday data
+    df = birthday.get_dataframe(date)
+    if df.empty: return None
+
+    # Generate the birthday message for all DOB entries (cached on disk)
+    response_text = get_cached_birthday_message(df['DOB'].to_list(), sender=sender_name, date=date.strftime("%d-%m-%Y"))
+
+    # Fill the precompiled template (HTML and plain-text versions)
+    return email_template.Digest.render(df, response_text)
+
+def get_digest(sender_name: str, date: pd.Timestamp = None):
+    """
+    Return the digest for `date` (default: today in IST) from the digest
+    store, building and storing it only if it is not there yet. A stored
+    digest is only used for the same roster file, so a roster update is
+    picked up right away; loading one needs neither decryption nor Gemini.
+
+    Parameters:
+    - sender_name: Name to be used in the personalized message.
+    - date: Day to get the digest for.
+    """
+    date = birthday.today_ist() if date is None else date
+    day  = date.strftime("%Y-%m-%d")
+    roster_hash = roster_format.file_digest(roster_format.roster_path())
+
+    digest = digest_store.load(day, roster_hash, sender_name)
+    if digest is digest_store.MISSING:
+        digest = build_digest(sender_name, date)
+        digest_store.save(day, roster_hash, sender_name, digest)
+    return digest
 
-    # Retrieve sender credentials from environment variables
-    sender_email = os.getenv('SENDER_EMAIL')
-    sender_password = os.getenv('EMAIL_PASSWORD')
+def prepare_digests(sender_name: str, days: int = digest_store.DAYS_AHEAD):
+    """
+    Make sure the digest store holds today's digest and those of the next
+    `days` days, and drop digests of past days.
+
+    Parameters:
+    - sender_name: Name to be used in the personalized message.
+    - days: How many days after today to prepare.
+    """
+    today = birthday.today_ist()
+    digest_store.prune(today.strftime("%Y-%m-%d"))
+    for offset in range(days + 1):
+        get_digest(sender_name, today + pd.Timedelta(days=offset))
 
-    # Set up the email message with MIME structure
-    msg = MIMEMultipart('alternative')
-    msg['From'] = sender_email
-    msg['To'] = receiver_email
-    msg['Subject'] = "Birthday Finder Notification"
+def make_message(digest: email_template.Digest, receiver_email: str):
+    """
+    Address a rendered digest to one recipient. The encoded body is shared
+    between all messages made from the same digest.
 
-    msg.attach(MIMEText(html, 'html'))
+    Parameters:
+    - digest: Digest returned by build_digest().
+    - receiver_email: Recipient's email address.
+    """
+    # Retrieve sender address from environment variables
+    return digest.message(os.getenv('SENDER_EMAIL'), receiver_email)
+
+def send_email(sender_name: str, receiver_email: str, session: mailer.SMTPSession = None):
+    """
+    Compose and send an email containing a birthday notification and personalized wishes.
+
+    Parameters:
+    - sender_name: Name to be used in the personalized message.
+    - receiver_email: Recipient's email address.
+    - session: Open SMTP session to reuse; a one-off connection is used if omitted.
+    """
+    digest = get_digest(sender_name)
+    if digest is None: return False
+    msg = make_message(digest, receiver_email)
 
     try:
-        # Connect to Gmail's SMTP server, login, and send the email
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        server.sendmail(sender_email, receiver_email, msg.as_string())
-        server.quit()
+        if session is not None:
+            session.send(msg)
+        else:
+            with mailer.SMTPSession() as one_off:
+                one_off.send(msg)
     except Exception as e:
         # Print error message if email sending fails
         print(f"Error: {e}")
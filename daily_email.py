@@ -1,68 +1,142 @@
 import os
+import db
 import dotenv
 import pytz
-import tempfile
+import mailer
+import metrics
 from datetime import datetime
-import mysql.connector
-from birthday_email_notifier import send_email
+from concurrent.futures import ThreadPoolExecutor
+from birthday_email_notifier import get_digest, make_message, prepare_digests, pregenerate_messages
 
 # Load environment variables from .env file if running locally.
 dotenv.load_dotenv()
 
-def get_connection():
+# Successful deliveries are written to the send ledger as soon as this many
+# have accumulated, so an interrupted run loses at most one batch
+LEDGER_BATCH = int(os.getenv("LEDGER_BATCH", 100))
+
+def get_run_slot(now: datetime) -> str:
+    """
+    Return the run slot of the job: RUN_SLOT if set, else 'morning' before
+    13:00 IST and 'evening' after. A manual rerun falls in the same slot as
+    the scheduled run it repeats.
+    """
+    return os.getenv("RUN_SLOT") or ("morning" if now.hour < 13 else "evening")
+
+@metrics.timed("db.get_pending_users")
+def get_pending_users(send_date: str, run_slot: str):
     """
-    Establish a secure MySQL connection using SSL.
-    The SSL certificate is loaded from the environment variable 'AIVEN_CA_PEM'.
+    Return (enabled, pending): the number of users with scheduling enabled,
+    and those among them with no send-ledger entry for this date and slot.
+    Both come from a single query.
     """
-    ssl_ca_content = os.getenv("AIVEN_CA_PEM")
-    ssl_ca_path = None
-    if ssl_ca_content:
-        with tempfile.NamedTemporaryFile(delete=False, mode="w", suffix=".pem") as tmp_file:
-            tmp_file.write(ssl_ca_content)
-            ssl_ca_path = tmp_file.name
-        os.chmod(ssl_ca_path, 0o600)
-
-    conn = mysql.connector.connect(
-        host=os.getenv("MYSQL_HOST"),
-        port=int(os.getenv("MYSQL_PORT")),
-        user=os.getenv("MYSQL_USER"),
-        password=os.getenv("MYSQL_PASSWORD"),
-        database=os.getenv("MYSQL_DATABASE"),
-        ssl_ca=ssl_ca_path,
-        ssl_verify_cert=True,
-        tls_versions=["TLSv1.2"],
-        use_pure=True
+    results = db.fetch_all(
+        """
+        SELECT s.email, l.email IS NOT NULL
+        FROM email_schedule s
+        LEFT JOIN email_send_ledger l
+          ON l.email = s.email AND l.send_date = %s AND l.run_slot = %s
+        WHERE s.scheduling_enabled = 1
+        """,
+        (send_date, run_slot)
     )
-    return conn
+    return len(results), [email for email, sent in results if not sent]
 
-def get_enabled_users():
+@metrics.timed("db.record_deliveries")
+def record_deliveries(send_date: str, run_slot: str, emails: list):
     """
-    Retrieve and return a list of email addresses from 'email_schedule' where
-    scheduling_enabled is set to 1.
+    Add successful deliveries to the send ledger in one batched insert.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT email FROM email_schedule WHERE scheduling_enabled = 1")
-    results = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return [row[0] for row in results]
+    db.executemany(
+        "INSERT IGNORE INTO email_send_ledger (email, send_date, run_slot) VALUES (%s, %s, %s)",
+        [(email, send_date, run_slot) for email in emails]
+    )
 
 def main():
     sender_name = os.getenv("SENDER_NAME", "Birthday Reminder")
-    enabled_users = get_enabled_users()
-    now = datetime.now(pytz.timezone("Asia/Kolkata")).strftime("%Y-%m-%d %H:%M:%S")
+    ist_now = datetime.now(pytz.timezone("Asia/Kolkata"))
+    now = ist_now.strftime("%Y-%m-%d %H:%M:%S")
+    send_date, run_slot = ist_now.strftime("%Y-%m-%d"), get_run_slot(ist_now)
 
-    if not enabled_users:
+    enabled, pending = get_pending_users(send_date, run_slot)
+    if not enabled:
         print(f"[{now}] No users with daily email enabled.")
         return
+    if not pending:
+        print(f"[{now}] All {enabled} users already received the {run_slot} email; nothing to send.")
+        return
+
+    # The digest is identical for every recipient: render it (and call Gemini)
+    # once per day and roster; later runs load it from the digest store
+    digest = get_digest(sender_name)
+    if digest is None:
+        print(f"[{now}] No birthdays today; nothing to send.")
+        return
 
-    for user_email in enabled_users:
-        success = send_email(sender_name, user_email)
-        if success:
-            print(f"[{now}] Email sent successfully to {user_email}")
-        else:
-            print(f"[{now}] Failed to send email to {user_email}")
+    # Delivery only addresses the prepared body; all messages go out in one
+    # run over a few concurrent SMTP sessions, so one slow recipient does not
+    # stall the rest. Deliveries reach the ledger in batches while it runs.
+    print(f"[{now}] Sending the {run_slot} email to {len(pending)} of {enabled} users.")
+    delivered, unrecorded = [], []
+
+    def flush(batch):
+        # Runs on the ledger thread: a failed insert is logged and retried at
+        # the end instead of stopping delivery
+        try:
+            record_deliveries(send_date, run_slot, batch)
+        except Exception as e:
+            print(f"[{now}] Could not record {len(batch)} deliveries in the send ledger (will retry): {e}")
+            unrecorded.extend(batch)
+
+    # on_result runs on the delivery event loop, so it only collects results;
+    # ledger inserts go to a single background thread
+    ledger = ThreadPoolExecutor(max_workers=1)
+
+    def on_result(user_email, success, error):
+        if not success:
+            print(f"[{now}] Failed to send email to {user_email}: {error}")
+            return
+        print(f"[{now}] Email sent successfully to {user_email}")
+        delivered.append(user_email)
+        if len(delivered) >= LEDGER_BATCH:
+            ledger.submit(flush, delivered[:])
+            delivered.clear()
+
+    messages = [make_message(digest, user_email) for user_email in pending]
+    try:
+        with metrics.span("email.deliver"):
+            _, report = mailer.deliver(messages, on_result=on_result)
+    finally:
+        # Record whatever was delivered, even if the run was interrupted
+        ledger.shutdown(wait=True)
+        remaining = unrecorded + delivered
+        if remaining:
+            try:
+                record_deliveries(send_date, run_slot, remaining)
+            except Exception:
+                print(f"[{now}] Delivered but NOT recorded in the send ledger; a rerun would mail them again: "
+                      + ", ".join(remaining))
+                raise
+
+    print(
+        f"[{now}] Delivered {report['sent']}/{len(messages)} in {report['elapsed']:.2f}s "
+        f"({report['throughput']:.1f} msg/s, p50 {report['latency_p50'] * 1000:.0f} ms, "
+        f"p95 {report['latency_p95'] * 1000:.0f} ms, max {report['latency_max'] * 1000:.0f} ms, "
+        f"{report['timed_out']} over {mailer.SMTP_SEND_TIMEOUT:.0f}s)"
+    )
 
 if __name__ == "__main__":
-    main()
+    try:
+        with metrics.span("daily_email.run"):
+            main()
+
+            # Store the digests of the next days, so later runs skip decryption and Gemini
+            prepare_digests(os.getenv("SENDER_NAME", "Birthday Reminder"))
+
+            # Optionally prepare tomorrow's Gemini message while we're here
+            if os.getenv("PREGENERATE_MESSAGES") == "1":
+                pregenerate_messages(os.getenv("SENDER_NAME", "Birthday Reminder"))
+    finally:
+        if metrics.ENABLED:
+            metrics.write_json()
+            print(f"Stage timings written to {metrics.JSON_PATH}")
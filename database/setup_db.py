@@ -39,7 +39,21 @@ def main():
     """
     cursor.execute(create_email_schedule_sql)
 
-    # 3) Insert the admin email into authorized_emails if not already present
+    # 3) Create the send ledger: one row per recipient, IST date and run slot
+    #    ('morning'/'evening'), written after each successful delivery so a
+    #    rerun of the daily job only mails the recipients that are missing
+    create_send_ledger_sql = """
+    CREATE TABLE IF NOT EXISTS email_send_ledger (
+        email VARCHAR(255) NOT NULL,
+        send_date DATE NOT NULL,
+        run_slot VARCHAR(16) NOT NULL,
+        sent_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (send_date, run_slot, email)
+    );
+    """
+    cursor.execute(create_send_ledger_sql)
+
+    # 4) Insert the admin email into authorized_emails if not already present
     insert_sql = """
     INSERT IGNORE INTO authorized_emails (email)
     VALUES (%s);
@@ -51,7 +65,7 @@ def main():
     cursor.close()
     conn.close()
 
-    print(f"Setup complete! Tables 'authorized_emails' and 'email_schedule' have been created (if needed), and admin email ({ADMIN_EMAIL}) has been inserted.")
+    print(f"Setup complete! Tables 'authorized_emails', 'email_schedule' and 'email_send_ledger' have been created (if needed), and admin email ({ADMIN_EMAIL}) has been inserted.")
 
 if __name__ == "__main__":
     main()
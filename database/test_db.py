@@ -1,9 +1,13 @@
 import os
+import sys
 import dotenv
 import logging
-import tempfile
 import mysql.connector
 
+# Allow importing the shared modules from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+
 # Load environment variables
 dotenv.load_dotenv()
 
@@ -24,29 +28,8 @@ def main():
     try:
         validate_env()
 
-        ssl_ca_content = os.getenv("AIVEN_CA_PEM")
-
-        # Write the certificate content to a secure temporary file with a .pem extension
-        with tempfile.NamedTemporaryFile(delete=False, mode="w", suffix=".pem") as tmp_file:
-            tmp_file.write(ssl_ca_content)
-            ssl_ca_path = tmp_file.name
-
-        # Set file permissions to allow read access only to the file owner
-        os.chmod(ssl_ca_path, 0o600)
-
-        # Establish MySQL connection
-        conn = mysql.connector.connect(
-            host=os.getenv("MYSQL_HOST"),
-            port=int(os.getenv("MYSQL_PORT")),
-            user=os.getenv("MYSQL_USER"),
-            password=os.getenv("MYSQL_PASSWORD"),
-            database=os.getenv("MYSQL_DATABASE"),
-            ssl_ca=ssl_ca_path,
-            ssl_verify_cert=True,
-            connection_timeout=10,
-            tls_versions=["TLSv1.2"],
-            use_pure=True
-        )
+        # Check out a pooled connection; the shared db module handles the SSL CA file
+        conn = db.get_connection()
         logger.info("Connected to MySQL with SSL verification.")
     except mysql.connector.Error as e:
         logger.error("Database connection error:", exc_info=True)
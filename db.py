@@ -0,0 +1,214 @@
+import os
+import time
+import atexit
+import dotenv
+import logging
+import tempfile
+import threading
+import mysql.connector
+from contextlib import contextmanager
+from mysql.connector import pooling
+
+# Load environment variables
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 3))
+# Connections idle for longer than this are pinged (and reconnected if needed) before reuse
+HEALTH_CHECK_AFTER = 30
+# How long to wait for a free pooled connection before giving up
+CHECKOUT_TIMEOUT = 10
+
+_lock = threading.Lock()
+_pool = None
+_ssl_ca_path = None
+_last_used = {}  # id(raw connection) -> time.monotonic() when it went back to the pool
+_stats = {}      # statement label -> {"count", "total", "max"} in seconds
+
+
+def _get_ssl_ca_path() -> str:
+    """
+    Write the SSL CA certificate from 'AIVEN_CA_PEM' to a temporary file once
+    per process and return its path. The file is removed at exit.
+
+    Raises:
+        EnvironmentError: If the SSL certificate content is not provided.
+    """
+    global _ssl_ca_path
+    if _ssl_ca_path is None:
+        ssl_ca_content = os.getenv("AIVEN_CA_PEM")
+        if not ssl_ca_content:
+            raise EnvironmentError("SSL CA certificate not found in environment variable 'AIVEN_CA_PEM'")
+
+        with tempfile.NamedTemporaryFile(delete=False, mode="w", suffix=".pem") as tmp_file:
+            tmp_file.write(ssl_ca_content)
+            path = tmp_file.name
+
+        # Set file permissions to allow read access only to the file owner
+        os.chmod(path, 0o600)
+        atexit.register(lambda: os.path.exists(path) and os.remove(path))
+        _ssl_ca_path = path
+    return _ssl_ca_path
+
+
+def _get_pool() -> pooling.MySQLConnectionPool:
+    """
+    Create the process-wide connection pool on first use and return it.
+    """
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name="birthday_reminder",
+                pool_size=POOL_SIZE,
+                pool_reset_session=True,
+                host=os.getenv("MYSQL_HOST"),
+                port=int(os.getenv("MYSQL_PORT")),
+                user=os.getenv("MYSQL_USER"),
+                password=os.getenv("MYSQL_PASSWORD"),
+                database=os.getenv("MYSQL_DATABASE"),
+                ssl_ca=_get_ssl_ca_path(),
+                ssl_verify_cert=True,
+                connection_timeout=10,
+                tls_versions=["TLSv1.2"],
+                use_pure=True
+            )
+        return _pool
+
+
+def get_connection():
+    """
+    Check out a healthy connection from the pool. Call close() on it to
+    return it to the pool.
+
+    Raises:
+        EnvironmentError: If the SSL certificate content is not provided.
+        mysql.connector.Error: If no connection can be obtained.
+    """
+    pool = _get_pool()
+    deadline = time.monotonic() + CHECKOUT_TIMEOUT
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except pooling.PoolError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+    idle_since = _last_used.get(id(conn._cnx))
+    if idle_since is not None and time.monotonic() - idle_since > HEALTH_CHECK_AFTER:
+        try:
+            conn.ping(reconnect=True, attempts=2, delay=1)
+        except Exception:
+            # Hand the connection back, or every failed ping shrinks the pool
+            try:
+                conn.close()
+            except mysql.connector.Error:
+                pass
+            raise
+    return conn
+
+
+@contextmanager
+def cursor(commit: bool = False):
+    """
+    Yield a cursor on a pooled connection and return the connection to the
+    pool afterwards. With `commit=True` the transaction is committed when
+    the block succeeds; it is rolled back if the block raises.
+    """
+    conn = get_connection()
+    cur = None
+    try:
+        # Opening the cursor can hit the server, so it is inside the try:
+        # the connection goes back to the pool even if that fails
+        cur = conn.cursor()
+        yield cur
+        if commit:
+            conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except mysql.connector.Error:
+            pass
+        raise
+    finally:
+        try:
+            if cur is not None:
+                cur.close()
+        finally:
+            _last_used[id(conn._cnx)] = time.monotonic()
+            conn.close()
+
+
+def _timed(cur, sql: str, params, many: bool = False):
+    """
+    Execute `sql` on `cur` and record how long it took.
+    """
+    label = " ".join(sql.split()[:4])
+    start = time.perf_counter()
+    try:
+        if many:
+            cur.executemany(sql, params)
+        else:
+            cur.execute(sql, params)
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            s = _stats.setdefault(label, {"count": 0, "total": 0.0, "max": 0.0})
+            s["count"] += 1
+            s["total"] += elapsed
+            s["max"] = max(s["max"], elapsed)
+        logger.debug("%s took %.1f ms", label, elapsed * 1000)
+
+
+def fetch_all(sql: str, params=()) -> list:
+    """
+    Run a query and return all rows.
+    """
+    with cursor() as cur:
+        _timed(cur, sql, params)
+        return cur.fetchall()
+
+
+def fetch_one(sql: str, params=()):
+    """
+    Run a query and return the first row (or None).
+    """
+    with cursor() as cur:
+        _timed(cur, sql, params)
+        row = cur.fetchone()
+        cur.fetchall()  # drain any remaining rows before the connection goes back
+        return row
+
+
+def execute(sql: str, params=()) -> int:
+    """
+    Run a single write statement in its own transaction and return the
+    number of affected rows.
+    """
+    with cursor(commit=True) as cur:
+        _timed(cur, sql, params)
+        return cur.rowcount
+
+
+def executemany(sql: str, seq_params) -> int:
+    """
+    Run a write statement for every parameter tuple in `seq_params` in a
+    single transaction and return the number of affected rows.
+    """
+    seq_params = list(seq_params)
+    if not seq_params:
+        return 0
+    with cursor(commit=True) as cur:
+        _timed(cur, sql, seq_params, many=True)
+        return cur.rowcount
+
+
+def query_stats() -> dict:
+    """
+    Return per-statement timing aggregates: count, total and max seconds.
+    """
+    with _lock:
+        return {label: dict(s) for label, s in _stats.items()}
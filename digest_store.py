@@ -0,0 +1,91 @@
+import os
+import json
+import dotenv
+import hashlib
+import tempfile
+import fernet_pool
+from cryptography.fernet import InvalidToken
+from email_template import Digest
+
+# Load environment variables from .env file
+dotenv.load_dotenv()
+
+# Rendered digests, one encrypted file per (IST date, roster hash, sender).
+# The GitHub workflow keeps this directory in the Actions cache, so the
+# evening run finds what the morning run built.
+STORE_PATH = os.getenv('DIGEST_STORE_PATH', os.path.join('.cache', 'digests'))
+DAYS_AHEAD = int(os.getenv('DIGEST_DAYS_AHEAD', 2))
+
+# Returned by load() when nothing is stored (None means "no birthdays that day")
+MISSING = object()
+
+
+def make_name(date: str, roster_hash: str, sender: str) -> str:
+    """
+    Build the file name of a stored digest.
+
+    Parameters:
+    - date: IST date of the digest (YYYY-mm-dd, so names sort by date).
+    - roster_hash: sha256 of the encrypted roster file the digest was built from.
+    - sender: Sender name used in the wishes.
+    """
+    sender_hash = hashlib.sha256(sender.encode()).hexdigest()[:12]
+    return f"{date}-{roster_hash[:16]}-{sender_hash}.digest"
+
+
+def _cipher():
+    """
+    Digests contain decrypted roster rows, so they are stored under KEY.
+    """
+    return fernet_pool.make_cipher(fernet_pool.parse_keys(os.getenv('KEY')))
+
+
+def load(date: str, roster_hash: str, sender: str, path: str = None):
+    """
+    Return the stored Digest, None if the day was stored as having no
+    birthdays, or MISSING if nothing usable is stored.
+    """
+    name = os.path.join(path or STORE_PATH, make_name(date, roster_hash, sender))
+    try:
+        with open(name, 'rb') as f:
+            data = json.loads(_cipher().decrypt(f.read()))
+    except (OSError, ValueError, InvalidToken):
+        return MISSING
+    if data.get('empty'):
+        return None
+    return Digest(data['html'], data['text'])
+
+
+def save(date: str, roster_hash: str, sender: str, digest: Digest, path: str = None):
+    """
+    Store a digest (or None for a day without birthdays), replacing the
+    file atomically.
+    """
+    directory = path or STORE_PATH
+    os.makedirs(directory, exist_ok=True)
+    data = {'empty': True} if digest is None else {'html': digest.html, 'text': digest.text}
+
+    # Concurrent callers may store the same digest: each writes its own
+    # temporary file, and the last replace wins
+    name = os.path.join(directory, make_name(date, roster_hash, sender))
+    fd, tmp_name = tempfile.mkstemp(dir=directory, prefix=os.path.basename(name), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_cipher().encrypt(json.dumps(data).encode()))
+        os.replace(tmp_name, name)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+
+def prune(today: str, path: str = None):
+    """
+    Delete stored digests for days before `today` (YYYY-mm-dd).
+    """
+    directory = path or STORE_PATH
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith('.digest') and name[:10] < today:
+            os.remove(os.path.join(directory, name))
@@ -0,0 +1,311 @@
+"""
+Precompiled template for the birthday notification email.
+
+The HTML shell and its CSS are minified and split around their slots once,
+at import; rendering a digest only joins the static pieces with the table
+and message. A Digest encodes its MIME body (text/plain and text/html
+alternatives) once and reuses it for every recipient, so per-recipient
+work is just the From/To/Subject headers.
+"""
+import re
+import html
+from email.charset import Charset, QP
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+SUBJECT = "Birthday Finder Notification"
+
+_CSS = """
+/* Keyframe animations */
+@keyframes fadeIn {
+    0% { opacity: 0; }
+    100% { opacity: 1; }
+}
+@keyframes slideIn {
+    0% { transform: translateY(-20px); opacity: 0; }
+    100% { transform: translateY(0); opacity: 1; }
+}
+body {
+    font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif;
+    background: linear-gradient(135deg, #E0EAFC, #CFDEF3);
+    margin: 0;
+    padding: 20px;
+    animation: fadeIn 2s ease-in-out;
+}
+.container {
+    max-width: 650px;
+    margin: auto;
+    background: #ffffff;
+    border-radius: 10px;
+    box-shadow: 0 8px 20px rgba(0, 0, 0, 0.1);
+    overflow: hidden;
+    animation: slideIn 1s ease-out;
+}
+.header {
+    background: linear-gradient(135deg, #667eea, #764ba2);
+    color: #fff;
+    text-align: center;
+    padding: 40px 20px;
+}
+.header h1 {
+    margin: 0;
+    font-size: 32px;
+    letter-spacing: 1px;
+}
+.content {
+    padding: 30px;
+}
+h2 {
+    color: #333;
+    font-size: 24px;
+    border-bottom: 2px solid #ddd;
+    padding-bottom: 5px;
+    margin-bottom: 20px;
+}
+/* Container for the DataFrame table to allow horizontal scrolling */
+.table-container {
+    overflow-x: auto;
+    margin-bottom: 30px;
+}
+.birthday-table {
+    width: 100%;
+    border-collapse: collapse;
+    min-width: 900px; /* Adjust this value if needed */
+}
+.birthday-table th, .birthday-table td {
+    border: 1px solid #ccc;
+    padding: 12px;
+    text-align: center;
+    transition: background-color 0.3s ease;
+}
+.birthday-table th {
+    background-color: #f7f7f7;
+    font-weight: bold;
+}
+.birthday-table tr:nth-child(even) {
+    background-color: #fefefe;
+}
+.birthday-table tr:hover {
+    background-color: #f1f1f1;
+}
+.message {
+    background-color: #e8f4fd;
+    border-left: 6px solid #3498db;
+    padding: 20px;
+    border-radius: 5px;
+    font-size: 18px;
+    line-height: 1.6;
+    color: #2c3e50;
+    margin-bottom: 30px;
+}
+.footer {
+    background-color: #f7f7f7;
+    text-align: center;
+    padding: 20px;
+    font-size: 14px;
+    color: #777;
+}
+"""
+
+# {name} marks a slot; {css} is filled at compile time, the rest per digest
+_SHELL = """
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Birthday Celebration Notification</title>
+    <style>{css}</style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>Birthday Celebration Notification</h1>
+        </div>
+        <div class="content">
+            <h2>Today's Birthday Celebrations</h2>
+            <div class="table-container">{table}</div>
+            <h2>Birthday Wishes</h2>
+            <div class="message">{message}</div>
+        </div>
+        <div class="footer">
+            {footer_html}
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+_FOOTER = (
+    "© 2025 Birthday Celebrations. Confidential and Proprietary. All rights reserved.",
+    "This email and its contents are intended solely for the designated recipient. If you have received "
+    "this email in error, please notify the sender immediately and delete it from your system.",
+)
+
+# UTF-8 bodies go out quoted-printable: mostly-ASCII HTML stays readable
+# and smaller than base64, and long minified lines are wrapped safely
+_UTF8_QP = Charset('utf-8')
+_UTF8_QP.body_encoding = QP
+
+
+def minify_css(css: str) -> str:
+    """
+    Strip comments and redundant whitespace from a stylesheet.
+    """
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{}:;,])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_html(markup: str) -> str:
+    """
+    Drop the whitespace between tags (safe for markup without <pre>).
+    """
+    return re.sub(r'>\s+<', '><', markup.strip())
+
+
+class Template:
+    """
+    A text template compiled once into static pieces and slot names.
+
+    Slots are written as {name}; those given as keyword arguments here are
+    filled at compile time, the others on every render().
+    """
+
+    def __init__(self, source: str, **constants):
+        parts = re.split(r'\{(\w+)\}', minify_html(re.sub(r'\s+', ' ', source)))
+        self.static = [parts[0]]
+        self.slots  = []
+        for name, text in zip(parts[1::2], parts[2::2]):
+            if name in constants:
+                self.static[-1] += constants[name] + text
+            else:
+                self.slots.append(name)
+                self.static.append(text)
+
+    def render(self, **values) -> str:
+        out = [self.static[0]]
+        for name, text in zip(self.slots, self.static[1:]):
+            out.append(values[name])
+            out.append(text)
+        return ''.join(out)
+
+
+NOTIFICATION = Template(_SHELL, css=minify_css(_CSS), footer_html='<br>'.join(_FOOTER).replace('©', '&copy;'))
+
+
+def _header_value(value: str) -> str:
+    """
+    Keep a header value on one line, so it cannot inject other headers.
+    """
+    return re.sub(r'[\r\n]+', ' ', value or '').strip()
+
+
+def _table_cells(df) -> tuple:
+    """
+    Return the header and the rows of `df` as lists of strings.
+    """
+    columns = [str(c) for c in df.columns]
+    rows    = [[str(v) for v in row] for row in zip(*(df[c].tolist() for c in df.columns))]
+    return columns, rows
+
+
+def table_html(df) -> str:
+    """
+    Render `df` as a compact HTML table (same markup as DataFrame.to_html
+    with index=False and the birthday-table class, minus the whitespace).
+    """
+    columns, rows = _table_cells(df)
+    head = ''.join(f'<th>{html.escape(c)}</th>' for c in columns)
+    body = ''.join('<tr>' + ''.join(f'<td>{html.escape(v)}</td>' for v in row) + '</tr>' for row in rows)
+    return (
+        '<table border="1" class="dataframe birthday-table">'
+        f'<thead><tr style="text-align: right;">{head}</tr></thead><tbody>{body}</tbody></table>'
+    )
+
+
+def table_text(df) -> str:
+    """
+    Render `df` as a plain-text table with aligned columns.
+    """
+    columns, rows = _table_cells(df)
+    widths = [max(len(v) for v in col) for col in zip(columns, *rows)]
+    return '\n'.join('  '.join(v.ljust(w) for v, w in zip(row, widths)).rstrip() for row in [columns, *rows])
+
+
+class EncodedMessage:
+    """
+    A ready-to-send message: per-recipient headers in front of a shared,
+    already encoded MIME body. Supports the parts of email.message.Message
+    the mailer uses (header lookup and as_string()).
+    """
+
+    def __init__(self, headers: dict, body: str):
+        self.headers = headers
+        self.body    = body
+
+    def __getitem__(self, name: str):
+        return self.headers.get(name)
+
+    def get(self, name: str, default=None):
+        return self.headers.get(name, default)
+
+    def as_string(self) -> str:
+        head = ''.join(f"{name}: {value}\n" for name, value in self.headers.items())
+        return head + self.body
+
+
+class Digest:
+    """
+    One day's notification, rendered as HTML and plain text from the same
+    data. The encoded MIME body is built on first use and then shared by
+    every message created from this digest.
+    """
+
+    def __init__(self, html: str, text: str):
+        self.html  = html
+        self.text  = text
+        self._body = None
+
+    @classmethod
+    def render(cls, df, message: str) -> 'Digest':
+        """
+        Fill the template with the birthday table and the wishes.
+
+        Parameters:
+        - df: Today's birthdays, as returned by birthday.get_dataframe().
+        - message: Plain-text birthday wishes.
+        """
+        html = NOTIFICATION.render(
+            table=table_html(df),
+            message=message.replace("\n", "<br>"),
+        )
+        text = "\n\n".join([
+            "Birthday Celebration Notification",
+            "Today's Birthday Celebrations\n" + table_text(df),
+            "Birthday Wishes\n" + message.strip(),
+            "--\n" + "\n".join(_FOOTER),
+        ]) + "\n"
+        return cls(html, text)
+
+    def body(self) -> str:
+        """
+        Return the encoded multipart/alternative body (plain text first,
+        HTML preferred), building it once.
+        """
+        if self._body is None:
+            root = MIMEMultipart('alternative')
+            root.attach(MIMEText(self.text, 'plain', _UTF8_QP))
+            root.attach(MIMEText(self.html, 'html', _UTF8_QP))
+            self._body = root.as_string()
+        return self._body
+
+    def message(self, sender_email: str, receiver_email: str) -> EncodedMessage:
+        """
+        Address the digest to one recipient.
+        """
+        headers = {
+            'From': _header_value(sender_email),
+            'To': _header_value(receiver_email),
+            'Subject': SUBJECT,
+        }
+        return EncodedMessage(headers, self.body())
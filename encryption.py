@@ -1,16 +1,78 @@
+"""
+Encrypt data-main.csv into the roster file read by the app.
+
+    python encryption.py                       # new key, full encryption (block format)
+    python encryption.py --incremental         # existing key, only new/changed rows (CSV format)
+
+The incremental mode reuses KEY (from the environment/.env, or secret.key)
+and the roster that is already on disk: rows whose keyed hash is unchanged
+are copied through as they are, so a small roster update takes seconds and
+leaves a minimal diff. It writes the per-cell CSV format, where rows are
+matched by hash wherever they moved. `--incremental --format bin` only
+reuses whole row groups (8192 rows) at the same position: changing a row
+re-encrypts its group and inserting one re-encrypts every later group, so
+on a small roster it is a full re-encryption. Full encryptions run across
+FERNET_WORKERS processes.
+"""
+import os
+import dotenv
+import argparse
 import pandas as pd
+import fernet_pool
+import roster_format
 from cryptography.fernet import Fernet
 
-key = Fernet.generate_key()
-cipher_suite = Fernet(key)
 
-with open("secret.key", "wb") as key_file:
-    key_file.write(key)
+def load_key():
+    """
+    Return the existing key: KEY from the environment (possibly "NEW,OLD"
+    during a rotation), else secret.key.
+    """
+    dotenv.load_dotenv()
+    if os.getenv('KEY'):
+        return fernet_pool.parse_keys(os.getenv('KEY'))
+    if os.path.exists("secret.key"):
+        with open("secret.key", "rb") as key_file:
+            return key_file.read().strip()
+    raise EnvironmentError("No existing key: set KEY or provide secret.key")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse the existing key and re-encrypt only added or changed rows")
+    parser.add_argument("--format", choices=["bin", "csv"],
+                        help="output format (default: bin, or csv with --incremental; incremental bin runs "
+                             "only reuse unchanged 8192-row groups at the same position)")
+    parser.add_argument("--source", default="data-main.csv", help="plaintext roster")
+    args = parser.parse_args()
+
+    if args.incremental:
+        key = load_key()
+    else:
+        key = Fernet.generate_key()
+        with open("secret.key", "wb") as key_file:
+            key_file.write(key)
+
+    fmt = args.format or ("csv" if args.incremental else "bin")
+
+    df = pd.read_csv(args.source)
 
-df = pd.read_csv("data-main.csv")
+    if fmt == "csv":
+        reused, encrypted = roster_format.write_csv(df, roster_format.LEGACY_CSV, key, incremental=args.incremental)
+        # The app prefers the block file, so drop it or it would keep serving the old roster
+        if os.path.exists(roster_format.BLOCK_FILE):
+            os.remove(roster_format.BLOCK_FILE)
+            print(f"Removed {roster_format.BLOCK_FILE}; the app now reads {roster_format.LEGACY_CSV}.")
+    else:
+        # Column blocks are encrypted in parallel across FERNET_WORKERS processes
+        reused, encrypted = roster_format.write_blocks(df, roster_format.BLOCK_FILE, key, incremental=args.incremental)
 
-encrypted_data = df.applymap(lambda x: cipher_suite.encrypt(str(x).encode()).decode())
+    if args.incremental:
+        print(f"Encryption completed successfully: {encrypted} rows encrypted, {reused} unchanged rows kept.")
+    else:
+        print("Encryption completed successfully.")
 
-encrypted_data.to_csv("data-encrypted.csv", index=False)
 
-print("Encryption completed successfully.")
+if __name__ == "__main__":
+    main()
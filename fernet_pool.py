@@ -0,0 +1,217 @@
+import os
+import pandas as pd
+from functools import lru_cache
+from cryptography.fernet import Fernet, MultiFernet
+from concurrent.futures import ProcessPoolExecutor
+
+# Number of worker processes used for bulk encryption/decryption.
+# Set FERNET_WORKERS=1 to force the serial path.
+WORKERS = int(os.getenv('FERNET_WORKERS', os.cpu_count() or 1))
+
+# Batches smaller than this are not worth the cost of shipping them to a pool
+MIN_PARALLEL = 4096
+CHUNK_SIZE   = 2048
+
+# Same for blobs, by total size: Fernet handles ~100 MB/s per core, so a
+# few MB are done serially before a pool round trip would pay off
+MIN_PARALLEL_BYTES = 4 << 20
+
+
+def parse_keys(value):
+    """
+    Parse a KEY setting. A comma-separated list ("NEW,OLD", used while a
+    key is being rotated) becomes a tuple of keys: tokens under any of them
+    can be decrypted, and new tokens are encrypted with the first one.
+    """
+    if value is None:
+        return None
+    text = value.decode() if isinstance(value, bytes) else value
+    keys = tuple(k.strip() for k in text.split(',') if k.strip())
+    return keys[0] if len(keys) == 1 else keys
+
+
+def make_cipher(key):
+    """
+    Return a Fernet for a single key, or a MultiFernet for a tuple of keys.
+    """
+    if isinstance(key, (tuple, list)):
+        return MultiFernet([Fernet(k) for k in key])
+    return Fernet(key)
+
+
+def _decrypt_chunk(key, tokens: list) -> list:
+    """
+    Decrypt one chunk of Fernet tokens (runs inside a worker).
+    """
+    cipher = make_cipher(key)
+    return [cipher.decrypt(t if isinstance(t, bytes) else t.encode()).decode() for t in tokens]
+
+
+def _encrypt_chunk(key, values: list) -> list:
+    """
+    Encrypt one chunk of plaintext values (runs inside a worker).
+    """
+    cipher = make_cipher(key)
+    return [cipher.encrypt(str(v).encode()).decode() for v in values]
+
+
+def _decrypt_blob_chunk(key, tokens: list) -> list:
+    """
+    Decrypt one chunk of binary Fernet tokens (runs inside a worker).
+    """
+    cipher = make_cipher(key)
+    return [cipher.decrypt(t) for t in tokens]
+
+
+def _encrypt_blob_chunk(key, blobs: list) -> list:
+    """
+    Encrypt one chunk of byte strings (runs inside a worker).
+    """
+    cipher = make_cipher(key)
+    return [cipher.encrypt(b) for b in blobs]
+
+
+def _rotate_chunk(keys, tokens: list) -> list:
+    """
+    Re-encrypt one chunk of Fernet tokens under the first key (runs inside a worker).
+    """
+    cipher = make_cipher(keys)
+    return [cipher.rotate(t).decode() for t in tokens]
+
+
+def _rotate_blob_chunk(keys, tokens: list) -> list:
+    """
+    Re-encrypt one chunk of binary Fernet tokens under the first key (runs inside a worker).
+    """
+    cipher = make_cipher(keys)
+    return [cipher.rotate(t) for t in tokens]
+
+
+@lru_cache(maxsize=None)
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Return a process pool with `workers` processes, created once and reused.
+    """
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def _run(func, key, items: list, workers, chunk_size: int, min_parallel: int = None) -> list:
+    """
+    Apply `func(key, chunk)` over `items` in chunks, in parallel when the
+    batch is large enough, and return the flattened results in order.
+    """
+    workers = WORKERS if workers is None else workers
+    min_parallel = MIN_PARALLEL if min_parallel is None else min_parallel
+    if workers <= 1 or len(items) < min_parallel:
+        return func(key, items)
+
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    out = []
+    for part in _get_pool(workers).map(func, [key] * len(chunks), chunks):
+        out.extend(part)
+    return out
+
+
+def decrypt_many(tokens, key, workers: int = None, chunk_size: int = CHUNK_SIZE) -> list:
+    """
+    Decrypt an iterable of Fernet tokens and return the plaintext strings
+    in the same order.
+
+    Parameters:
+    - tokens: Fernet tokens as strings or bytes.
+    - key: Fernet key used for decryption.
+    - workers: Number of worker processes (defaults to FERNET_WORKERS).
+    - chunk_size: Number of tokens handed to a worker at a time.
+    """
+    return _run(_decrypt_chunk, key, list(tokens), workers, chunk_size)
+
+
+def encrypt_many(values, key, workers: int = None, chunk_size: int = CHUNK_SIZE) -> list:
+    """
+    Encrypt an iterable of values (converted with str()) and return the
+    Fernet tokens as strings in the same order.
+
+    Parameters:
+    - values: Plaintext values.
+    - key: Fernet key used for encryption.
+    - workers: Number of worker processes (defaults to FERNET_WORKERS).
+    - chunk_size: Number of values handed to a worker at a time.
+    """
+    return _run(_encrypt_chunk, key, list(values), workers, chunk_size)
+
+
+def _run_blobs(func, key, blobs: list, workers) -> list:
+    """
+    Apply `func(key, chunk)` over `blobs`, one blob per unit of work on
+    the pool when they add up to at least MIN_PARALLEL_BYTES, else serially.
+    """
+    if sum(len(b) for b in blobs) < MIN_PARALLEL_BYTES:
+        return func(key, blobs)
+    return _run(func, key, blobs, workers, 1, min_parallel=2)
+
+
+def decrypt_blobs(tokens, key, workers: int = None) -> list:
+    """
+    Decrypt a few large Fernet tokens (bytes) and return the plaintext
+    bytes in the same order. Each token is its own unit of work, so a
+    batch large enough in bytes is spread over the pool.
+    """
+    return _run_blobs(_decrypt_blob_chunk, key, list(tokens), workers)
+
+
+def encrypt_blobs(blobs, key, workers: int = None) -> list:
+    """
+    Encrypt a few large byte strings and return the Fernet tokens (bytes)
+    in the same order, one unit of work per blob.
+    """
+    return _run_blobs(_encrypt_blob_chunk, key, list(blobs), workers)
+
+
+def rotate_many(tokens, keys, workers: int = None, chunk_size: int = CHUNK_SIZE) -> list:
+    """
+    Re-encrypt Fernet tokens under keys[0] and return the new tokens as
+    strings in the same order. Each token may be under any of `keys`; the
+    plaintext never leaves the worker that rotates it.
+
+    Parameters:
+    - tokens: Fernet tokens as strings or bytes.
+    - keys: Tuple of keys, the new one first.
+    - workers: Number of worker processes (defaults to FERNET_WORKERS).
+    - chunk_size: Number of tokens handed to a worker at a time.
+    """
+    return _run(_rotate_chunk, tuple(keys), list(tokens), workers, chunk_size)
+
+
+def rotate_blobs(tokens, keys, workers: int = None) -> list:
+    """
+    Re-encrypt a few large Fernet tokens (bytes) under keys[0], one unit
+    of work per token.
+    """
+    return _run_blobs(_rotate_blob_chunk, tuple(keys), list(tokens), workers)
+
+
+def _map_frame(func, df: pd.DataFrame, key, workers) -> pd.DataFrame:
+    """
+    Run `func` over every cell of `df` (column by column) as a single batch
+    and rebuild a frame with the same columns and index.
+    """
+    flat = func([v for col in df.columns for v in df[col].tolist()], key, workers)
+    n = len(df)
+    return pd.DataFrame(
+        {col: flat[i * n:(i + 1) * n] for i, col in enumerate(df.columns)},
+        index=df.index
+    )
+
+
+def decrypt_frame(enc: pd.DataFrame, key, workers: int = None) -> pd.DataFrame:
+    """
+    Decrypt every cell of `enc`, keeping its columns and index.
+    """
+    return _map_frame(decrypt_many, enc, key, workers)
+
+
+def encrypt_frame(df: pd.DataFrame, key, workers: int = None) -> pd.DataFrame:
+    """
+    Encrypt every cell of `df`, keeping its columns and index.
+    """
+    return _map_frame(encrypt_many, df, key, workers)
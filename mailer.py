@@ -0,0 +1,241 @@
+import os
+import time
+import dotenv
+import asyncio
+import smtplib
+import metrics
+from concurrent.futures import ThreadPoolExecutor
+
+# Load environment variables from .env file
+dotenv.load_dotenv()
+
+# Point these at a local debugging server (e.g. SMTP_HOST=localhost SMTP_PORT=1025
+# SMTP_STARTTLS=0) to test delivery without sending real mail.
+SMTP_HOST     = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT     = int(os.getenv('SMTP_PORT', 587))
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', '1') != '0'
+
+# Delivery engine settings: parallel SMTP sessions, messages/sec allowed per
+# provider (0 = unlimited) and the time budget for a single message
+SMTP_CONCURRENCY  = int(os.getenv('SMTP_CONCURRENCY', 4))
+SMTP_RATE_LIMIT   = float(os.getenv('SMTP_RATE_LIMIT', 5))
+SMTP_SEND_TIMEOUT = float(os.getenv('SMTP_SEND_TIMEOUT', 30))
+
+# Errors after which the connection is considered dead and worth reopening
+_DROPPED = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class SMTPSession:
+    """
+    A single authenticated SMTP connection reused for many messages.
+    The connection is opened on first use and reopened transparently if
+    the server drops it.
+    """
+
+    def __init__(self, sender_email: str = None, password: str = None,
+                 host: str = SMTP_HOST, port: int = SMTP_PORT, starttls: bool = SMTP_STARTTLS,
+                 timeout: float = 30):
+        self.sender_email = sender_email or os.getenv('SENDER_EMAIL')
+        self.password     = password if password is not None else os.getenv('EMAIL_PASSWORD')
+        self.host         = host
+        self.port         = port
+        self.starttls     = starttls
+        self.timeout      = timeout
+        self.server       = None
+        self.connects     = 0
+
+    def connect(self):
+        """
+        Open the connection, upgrade it with STARTTLS and log in.
+        """
+        self.close()
+        with metrics.span('smtp.connect'):
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                with metrics.span('smtp.starttls'):
+                    server.starttls()
+            if self.password:
+                with metrics.span('smtp.login'):
+                    server.login(self.sender_email, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+        self.connects += 1
+
+    def send(self, msg, to_addrs=None):
+        """
+        Send a prepared message, reconnecting once if the connection was lost.
+
+        Parameters:
+        - msg: The email.message.Message to send.
+        - to_addrs: Recipients; defaults to the message's 'To' header.
+        """
+        to_addrs = to_addrs or [msg['To']]
+        payload  = msg.as_string()
+        for attempt in range(2):
+            if self.server is None:
+                self.connect()
+            try:
+                with metrics.span('smtp.send'):
+                    self.server.sendmail(self.sender_email, to_addrs, payload)
+                return
+            except _DROPPED:
+                # Release the dead socket before reconnecting
+                self.server.close()
+                self.server = None
+                if attempt:
+                    raise
+
+    def close(self):
+        """
+        Close the connection if it is open.
+        """
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                self.server.close()
+            self.server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _RateLimiter:
+    """
+    Spaces out message starts so no more than `rate` begin per second.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next     = 0.0
+        self.lock     = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        async with self.lock:
+            delay = self.next - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.next = max(self.next, loop.time()) + self.interval
+
+
+def _percentile(values: list, q: float) -> float:
+    """
+    Return the q-th percentile (0-100) of `values` by nearest rank.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+async def deliver_async(messages, concurrency: int = SMTP_CONCURRENCY, rate_limit: float = SMTP_RATE_LIMIT,
+                        timeout: float = SMTP_SEND_TIMEOUT, session_factory=SMTPSession, on_result=None):
+    """
+    Send messages over up to `concurrency` SMTP sessions at once.
+
+    Blocking SMTP work runs on a thread pool, one session per thread slot.
+    Message starts are rate limited per SMTP host. A message still in
+    flight after `timeout` no longer holds up the rest: its slot gets a new
+    session, and the stalled send is left to finish on its own thread (the
+    socket timeout of the session bounds it). Since the message may still
+    go out, it is only settled when that send ends, as sent or failed; the
+    call returns once every send has ended, so a late delivery is never
+    reported as a failure.
+
+    Returns (results, report): results is a list of (recipient, success,
+    error) tuples in input order, report holds sent/failed counts, the
+    number of sends that exceeded `timeout`, elapsed seconds, throughput in
+    messages/sec and p50/p95/max latency in seconds.
+
+    Parameters:
+    - messages: Prepared email messages with a 'To' header.
+    - concurrency: Number of SMTP sessions used in parallel.
+    - rate_limit: Maximum message starts per second per host (0 = unlimited).
+    - timeout: Seconds after which a message stops holding its session slot.
+    - session_factory: Callable returning a new SMTPSession (handy for tests).
+    - on_result: Optional callable, called on the event loop with
+      (recipient, success, error) as soon as each message is settled.
+    """
+    messages = list(messages)
+    concurrency = max(1, min(concurrency, len(messages) or 1))
+    loop = asyncio.get_running_loop()
+
+    sessions = asyncio.Queue()
+    for _ in range(concurrency):
+        sessions.put_nowait(session_factory())
+
+    limiters  = {}
+    latencies = []
+    results   = [None] * len(messages)
+    stalled   = []  # tasks settling sends that exceeded the timeout
+
+    async def settle(i, msg, future, start, late=None):
+        try:
+            await future
+            results[i] = (msg['To'], True, None)
+        except (smtplib.SMTPException, OSError) as e:
+            results[i] = (msg['To'], False, str(e) if late is None else f"{e} (after exceeding {timeout}s)")
+        latencies.append(time.perf_counter() - start)
+        if on_result is not None:
+            on_result(*results[i])
+        if late is not None:
+            await loop.run_in_executor(executor, late.close)
+
+    async def send_one(i, msg):
+        session = await sessions.get()
+        limiter = limiters.setdefault(session.host, _RateLimiter(rate_limit))
+        try:
+            await limiter.wait()
+            start  = time.perf_counter()
+            future = loop.run_in_executor(executor, session.send, msg)
+            # asyncio.wait (unlike wait_for) leaves the send running on timeout
+            done, _ = await asyncio.wait({future}, timeout=timeout)
+            if done:
+                await settle(i, msg, future, start)
+            else:
+                # The worker thread is still using this session: hand the slot a new one
+                stalled.append(asyncio.ensure_future(settle(i, msg, future, start, late=session)))
+                session = session_factory()
+        finally:
+            sessions.put_nowait(session)
+
+    started = time.perf_counter()
+    # Spare threads let a replacement session work while a timed-out one is still stuck
+    executor = ThreadPoolExecutor(max_workers=concurrency * 2)
+    try:
+        await asyncio.gather(*(send_one(i, msg) for i, msg in enumerate(messages)))
+        await asyncio.gather(*stalled)
+    finally:
+        while not sessions.empty():
+            await loop.run_in_executor(executor, sessions.get_nowait().close)
+        executor.shutdown(wait=False)
+    elapsed = time.perf_counter() - started
+
+    sent = sum(1 for _, ok, _ in results if ok)
+    report = {
+        'sent': sent,
+        'failed': len(results) - sent,
+        'timed_out': len(stalled),
+        'elapsed': elapsed,
+        'throughput': len(results) / elapsed if elapsed > 0 else 0.0,
+        'latency_p50': _percentile(latencies, 50),
+        'latency_p95': _percentile(latencies, 95),
+        'latency_max': max(latencies, default=0.0),
+    }
+    return results, report
+
+
+def deliver(messages, **kwargs):
+    """
+    Synchronous wrapper around deliver_async() for scripts.
+    """
+    return asyncio.run(deliver_async(messages, **kwargs))
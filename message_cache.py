@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import dotenv
+import sqlite3
+import hashlib
+
+# Load environment variables from .env file
+dotenv.load_dotenv()
+
+CACHE_PATH  = os.getenv('MESSAGE_CACHE_PATH', os.path.join('.cache', 'messages.sqlite3'))
+TTL         = int(os.getenv('MESSAGE_CACHE_TTL', 2 * 24 * 3600))
+MAX_ENTRIES = int(os.getenv('MESSAGE_CACHE_MAX_ENTRIES', 1000))
+
+
+def make_key(date: str, dobs, sender: str) -> str:
+    """
+    Build the cache key for a generated message. The DOBs are treated as a
+    set and the key is hashed, so no birthday data is stored in clear.
+
+    Parameters:
+    - date: IST date the message is written for (dd-mm-YYYY).
+    - dobs: DOB strings of the people in the message.
+    - sender: Sender name used in the regards line.
+    """
+    raw = json.dumps([date, sorted(set(dobs)), sender])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """
+    Open the cache database, creating it on first use.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            key      TEXT PRIMARY KEY,
+            message  TEXT NOT NULL,
+            created  REAL NOT NULL,
+            accessed REAL NOT NULL
+        )
+        """
+    )
+    return conn
+
+
+def get(key: str, path: str = None):
+    """
+    Return the cached message for `key`, or None if missing or expired.
+    """
+    now = time.time()
+    conn = _connect(path or CACHE_PATH)
+    try:
+        with conn:
+            row = conn.execute(
+                "SELECT message FROM messages WHERE key = ? AND created > ?", (key, now - TTL)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE messages SET accessed = ? WHERE key = ?", (now, key))
+    finally:
+        conn.close()
+    return None if row is None else row[0]
+
+
+def put(key: str, message: str, path: str = None):
+    """
+    Store a message, then drop expired entries and evict the least recently
+    used ones beyond MAX_ENTRIES.
+    """
+    now = time.time()
+    conn = _connect(path or CACHE_PATH)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO messages (key, message, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, message, now, now)
+            )
+            conn.execute("DELETE FROM messages WHERE created <= ?", (now - TTL,))
+            conn.execute(
+                """
+                DELETE FROM messages WHERE key NOT IN (
+                    SELECT key FROM messages ORDER BY accessed DESC LIMIT ?
+                )
+                """,
+                (MAX_ENTRIES,)
+            )
+    finally:
+        conn.close()
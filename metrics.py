@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import dotenv
+import tempfile
+import threading
+import functools
+from contextlib import contextmanager
+
+# Load environment variables from .env file
+dotenv.load_dotenv()
+
+# Instrumentation is off unless METRICS_ENABLED=1; when off, spans and
+# timed functions cost a flag check and nothing else.
+ENABLED   = os.getenv('METRICS_ENABLED', '0') == '1'
+JSON_PATH = os.getenv('METRICS_JSON_PATH', 'metrics-summary.json')
+TEXT_PATH = os.getenv('METRICS_TEXT_PATH', 'metrics.prom')
+
+# Samples kept per stage for percentiles; older ones are overwritten
+MAX_SAMPLES = 10000
+
+_lock   = threading.Lock()
+_stages = {}  # name -> {"count", "total", "max", "samples"}
+
+
+def observe(name: str, seconds: float):
+    """
+    Record one duration for stage `name`.
+    """
+    if not ENABLED:
+        return
+    with _lock:
+        s = _stages.get(name)
+        if s is None:
+            s = _stages[name] = {"count": 0, "total": 0.0, "max": 0.0, "samples": []}
+        if len(s["samples"]) < MAX_SAMPLES:
+            s["samples"].append(seconds)
+        else:
+            s["samples"][s["count"] % MAX_SAMPLES] = seconds
+        s["count"] += 1
+        s["total"] += seconds
+        s["max"] = max(s["max"], seconds)
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time the enclosed block as stage `name`.
+    """
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def timed(name: str):
+    """
+    Decorator that times every call of the function as stage `name`.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _percentile(ordered: list, q: float) -> float:
+    """
+    Return the q-th percentile (0-100) of sorted `ordered` by nearest rank.
+    """
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def summary() -> dict:
+    """
+    Return count, total, p50, p95 and max (seconds) for every stage.
+    """
+    with _lock:
+        stages = {name: (dict(s), sorted(s["samples"])) for name, s in _stages.items()}
+    return {
+        name: {
+            "count": s["count"],
+            "total": s["total"],
+            "p50": _percentile(ordered, 50),
+            "p95": _percentile(ordered, 95),
+            "max": s["max"],
+        }
+        for name, (s, ordered) in sorted(stages.items())
+    }
+
+
+def write_json(path: str = None):
+    """
+    Write the summary as JSON (used at the end of each daily_email.py run).
+    """
+    with open(path or JSON_PATH, 'w') as f:
+        json.dump(summary(), f, indent=2)
+
+
+def write_text(path: str = None):
+    """
+    Write the summary in the Prometheus text format (used by the Streamlit
+    server). The file is replaced atomically so scrapers never see half of it.
+    """
+    lines = [
+        "# HELP birthday_stage_seconds Time spent per stage.",
+        "# TYPE birthday_stage_seconds summary",
+    ]
+    for name, s in summary().items():
+        label = f'stage="{name}"'
+        lines.append(f'birthday_stage_seconds{{{label},quantile="0.5"}} {s["p50"]:.6f}')
+        lines.append(f'birthday_stage_seconds{{{label},quantile="0.95"}} {s["p95"]:.6f}')
+        lines.append(f'birthday_stage_seconds{{{label},quantile="1"}} {s["max"]:.6f}')
+        lines.append(f'birthday_stage_seconds_sum{{{label}}} {s["total"]:.6f}')
+        lines.append(f'birthday_stage_seconds_count{{{label}}} {s["count"]}')
+
+    # Every Streamlit session writes this file, so each write goes through
+    # its own temporary file
+    path = path or TEXT_PATH
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
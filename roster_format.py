@@ -0,0 +1,594 @@
+"""
+On-disk formats for the encrypted roster.
+
+Legacy format (`data-encrypted.csv`): a CSV where every cell is its own
+Fernet token.
+
+Block format (`data-encrypted.bin`): rows are split into row groups and
+each column of each row group is stored as one authenticated Fernet blob
+holding the zlib-compressed JSON `[group, column name, values]`. Layout:
+
+    MAGIC
+    4-byte big-endian header length
+    JSON header: {"version", "columns", "rows", "row_group_size", "blocks", "digests"}
+    blocks, row group by row group, column by column
+
+`blocks[g][c]` is the byte length of the blob for row group `g`, column `c`.
+Blobs are stored as raw (not base64) Fernet tokens. The header itself is
+not authenticated, so every blob names its own position and is checked
+against it on decryption: swapped or reordered blobs fail to load instead
+of decrypting into the wrong column.
+
+Both readers stream: a column is decrypted in chunks of rows and other
+rows are read back from the file on demand, so loading a roster never
+holds the whole encrypted file in memory.
+
+Run `python roster_format.py [src.csv] [dest.bin]` with KEY set to convert
+an existing encrypted CSV to the block format.
+"""
+import io
+import os
+import csv
+import sys
+import json
+import zlib
+import base64
+import struct
+import hashlib
+import tempfile
+import dotenv
+import threading
+import numpy as np
+import pandas as pd
+import fernet_pool
+from collections import deque, OrderedDict
+
+MAGIC          = b'BDROSTER\x01'
+FORMAT_VERSION = 2
+LEGACY_CSV     = "data-encrypted.csv"
+BLOCK_FILE     = "data-encrypted.bin"
+ROW_GROUP_SIZE = 8192
+
+# Sidecar written next to an encrypted CSV: the sha256 of the CSV followed
+# by one keyed row hash per line, used for incremental re-encryption
+ROW_HASH_SUFFIX = ".rowhash"
+
+# Rows decrypted per step while streaming a column, and bytes read per
+# step while scanning a legacy CSV; together they bound the memory used
+# to load a roster of any size
+STREAM_CHUNK_ROWS = 8192
+READ_SIZE         = 1 << 20
+
+# Decrypted column blocks a BlockRoster keeps for row lookups (least
+# recently used are dropped); each holds up to ROW_GROUP_SIZE values
+MAX_CACHED_BLOCKS = 4
+
+
+def _pack(values: list, g: int, column: str) -> bytes:
+    """
+    Serialize the block of row group `g`, column `column` to compressed
+    JSON, tagged with its position.
+    """
+    return zlib.compress(json.dumps([g, column, values], separators=(',', ':')).encode(), 6)
+
+
+def _unpack(payload: bytes, g: int, column: str) -> list:
+    """
+    Inverse of `_pack`; raises ValueError unless the block was written for
+    row group `g`, column `column`.
+    """
+    tag_g, tag_column, values = json.loads(zlib.decompress(payload))
+    if (tag_g, tag_column) != (g, column):
+        raise ValueError(f"Roster block ({g}, {column!r}) holds block ({tag_g}, {tag_column!r})")
+    return values
+
+
+def file_digest(path: str) -> str:
+    """
+    Return the sha256 of a file, read in fixed-size pieces.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for buf in iter(lambda: f.read(READ_SIZE), b''):
+            digest.update(buf)
+    return digest.hexdigest()
+
+
+def _hash_key(key) -> bytes:
+    """
+    Derive the row-hash key from the Fernet key (the first one, if several).
+    """
+    key = key[0] if isinstance(key, (tuple, list)) else key
+    key = key if isinstance(key, bytes) else key.encode()
+    return hashlib.blake2b(key, digest_size=32, person=b'roster-rowhash').digest()
+
+
+def _hash_rows(rows, hash_key: bytes) -> list:
+    """
+    Hash rows given as lists of strings.
+    """
+    return [
+        hashlib.blake2b('\x1f'.join(row).encode(), key=hash_key, digest_size=16).hexdigest()
+        for row in rows
+    ]
+
+
+def row_hashes(df: pd.DataFrame, key) -> list:
+    """
+    Return a stable hash of every row of `df`, computed from the values as
+    they are encrypted (str()). The hash is keyed with a key derived from
+    the Fernet key, so it reveals nothing about the rows without it.
+    """
+    rows = ([str(v) for v in row] for row in zip(*(df[c].tolist() for c in df.columns)))
+    return _hash_rows(rows, _hash_key(key))
+
+
+def _group_digests(hashes: list, row_group_size: int) -> list:
+    """
+    Combine the row hashes of each row group into one digest per group.
+    """
+    return [
+        hashlib.blake2b(''.join(hashes[i:i + row_group_size]).encode(), digest_size=16).hexdigest()
+        for i in range(0, len(hashes), row_group_size)
+    ]
+
+
+def _write_atomic(path: str, chunks):
+    """
+    Write byte chunks next to `path` and swap the file in, so readers never
+    see a partial file. Returns the sha256 of what was written.
+    """
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                digest.update(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # e.g. a malformed row or an invalid token halfway through a rotation
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest.hexdigest()
+
+
+def write_blocks(df: pd.DataFrame, path: str, key, row_group_size: int = ROW_GROUP_SIZE,
+                 workers: int = None, incremental: bool = False) -> tuple:
+    """
+    Encrypt a plaintext roster into the block format and write it to `path`.
+    Every value is stored as str(), matching the legacy per-cell encryption.
+
+    Each row group carries a digest of its row hashes. With `incremental`,
+    row groups whose digest matches the same group of the existing file
+    (written with the same key) are copied over as they are, and only the
+    other groups are encrypted. Returns (reused rows, encrypted rows).
+    """
+    columns = [str(c) for c in df.columns]
+    width   = len(columns)
+    digests = _group_digests(row_hashes(df, key), row_group_size)
+
+    old = None
+    if incremental and os.path.exists(path):
+        try:
+            old = BlockRoster(path, key)
+        except ValueError:
+            old = None
+        if old is not None and (old.columns != columns or old.row_group_size != row_group_size):
+            old.close()
+            old = None
+    old_digests = old.digests if old is not None else []
+
+    keep = [g < len(old_digests) and old_digests[g] == d for g, d in enumerate(digests)]
+    payloads = [
+        _pack([str(v) for v in df[col].iloc[g * row_group_size:(g + 1) * row_group_size].tolist()], g, name)
+        for g in range(len(digests)) if not keep[g] for col, name in zip(df.columns, columns)
+    ]
+    fresh = iter(base64.urlsafe_b64decode(t) for t in fernet_pool.encrypt_blobs(payloads, key, workers))
+
+    blobs = []
+    for g in range(len(digests)):
+        if keep[g]:
+            blobs.extend(old._read_blob(g, c) for c in range(width))
+        else:
+            blobs.extend(next(fresh) for _ in range(width))
+    if old is not None:
+        old.close()
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'columns': columns,
+        'rows': len(df),
+        'row_group_size': row_group_size,
+        'blocks': [[len(b) for b in blobs[i:i + width]] for i in range(0, len(blobs), width)],
+        'digests': digests,
+    }).encode()
+    _write_atomic(path, [MAGIC, struct.pack('>I', len(header)), header, *blobs])
+
+    reused = sum(min(row_group_size, len(df) - g * row_group_size) for g in range(len(digests)) if keep[g])
+    return reused, len(df) - reused
+
+
+def _csv_row_hashes(path: str, roster: 'CsvRoster', key) -> list:
+    """
+    Return the row hashes of an encrypted CSV: from its `.rowhash` sidecar
+    when that was written for exactly this file, otherwise by decrypting it.
+    """
+    sidecar = path + ROW_HASH_SUFFIX
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            lines = f.read().split()
+        if lines and lines[0] == file_digest(path) and len(lines) - 1 == len(roster):
+            return lines[1:]
+
+    hash_key = _hash_key(key)
+    return [h for rows in roster.iter_rows() for h in _hash_rows(rows, hash_key)]
+
+
+def write_csv(df: pd.DataFrame, path: str, key, workers: int = None, incremental: bool = False) -> tuple:
+    """
+    Encrypt a plaintext roster into the legacy per-cell CSV format and
+    write it to `path`, along with a `.rowhash` sidecar of its row hashes.
+
+    With `incremental`, the encrypted line of every row whose hash is found
+    in the existing file is copied over byte for byte, so only new or
+    changed rows are encrypted and the diff stays minimal. Rows are written
+    in chunks. Returns (reused rows, encrypted rows).
+    """
+    columns = [str(c) for c in df.columns]
+    width   = len(columns)
+    hashes  = row_hashes(df, key)
+    values  = [df[c].tolist() for c in df.columns]
+
+    old, unused = None, {}
+    if incremental and os.path.exists(path):
+        old = CsvRoster(path, key)
+        if old.columns == columns:
+            for pos, h in enumerate(_csv_row_hashes(path, old, key)):
+                unused.setdefault(h, deque()).append(pos)
+
+    header = io.StringIO()
+    csv.writer(header, lineterminator='\n').writerow(columns)
+    counts = {'reused': 0}
+
+    def chunks():
+        yield header.getvalue().encode()
+        for first in range(0, len(df), STREAM_CHUNK_ROWS):
+            todo, lines = [], {}
+            for i in range(first, min(first + STREAM_CHUNK_ROWS, len(df))):
+                bucket = unused.get(hashes[i])
+                if bucket:
+                    lines[i] = old._read_lines(bucket[0], bucket[0] + 1)[0]
+                    bucket.popleft()
+                else:
+                    todo.append(i)
+            counts['reused'] += len(lines)
+
+            tokens = fernet_pool.encrypt_many([col[i] for i in todo for col in values], key, workers)
+            for j, i in enumerate(todo):
+                lines[i] = ','.join(tokens[j * width:(j + 1) * width]).encode()
+            yield b''.join(lines[i] + b'\n' for i in sorted(lines))
+
+    try:
+        digest = _write_atomic(path, chunks())
+    finally:
+        if old is not None:
+            old.close()
+    _write_atomic(path + ROW_HASH_SUFFIX, ['\n'.join([digest, *hashes, '']).encode()])
+    return counts['reused'], len(df) - counts['reused']
+
+
+class CsvRoster:
+    """
+    Legacy roster where every CSV cell is a separate Fernet token.
+
+    Only the byte offset of each row is kept in memory. Columns are
+    decrypted by streaming the file in chunks of rows, and single rows
+    are read back from their offsets when a query returns them. The file
+    stays open, so an atomic replacement on disk does not affect a
+    roster that is already loaded.
+    """
+
+    def __init__(self, path: str, key, chunk_rows: int = STREAM_CHUNK_ROWS):
+        self.key        = key
+        self.chunk_rows = chunk_rows
+        self._file      = open(path, 'rb')
+        self._lock      = threading.Lock()
+
+        header        = self._file.readline()
+        self.columns  = next(csv.reader([header.decode('utf-8-sig')]))
+        self._offsets = self._scan_rows(len(header))
+        self.n_rows   = len(self._offsets) - 1
+
+    def _scan_rows(self, start: int) -> np.ndarray:
+        """
+        Return the byte offset of every data row plus the end of the last
+        one, reading the file in fixed-size pieces.
+        """
+        parts, pos, last = [np.array([start], dtype=np.int64)], start, b'\n'
+        self._file.seek(start)
+        while True:
+            buf = self._file.read(READ_SIZE)
+            if not buf:
+                break
+            ends = np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) == ord('\n'))
+            parts.append(ends.astype(np.int64) + pos + 1)
+            pos, last = pos + len(buf), buf[-1:]
+        if last != b'\n':
+            parts.append(np.array([pos + 1], dtype=np.int64))
+        offsets = np.concatenate(parts)
+
+        # Skip blank lines (e.g. extra newlines at the end of the file)
+        starts = offsets[:-1][np.diff(offsets) > 2]
+        return np.append(starts, offsets[-1])
+
+    def _read_lines(self, first: int, last: int) -> list:
+        """
+        Read data rows `first` to `last` (exclusive) as raw lines.
+        """
+        with self._lock:
+            self._file.seek(int(self._offsets[first]))
+            data = self._file.read(int(self._offsets[last] - self._offsets[first]))
+        return [line.rstrip(b'\r') for line in data.split(b'\n') if line.strip()]
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def iter_column(self, name: str):
+        """
+        Yield the decrypted values of one column, one chunk of rows at a time.
+        """
+        c = self.columns.index(name)
+        for first in range(0, self.n_rows, self.chunk_rows):
+            lines  = self._read_lines(first, min(first + self.chunk_rows, self.n_rows))
+            tokens = [line.split(b',', c + 1)[c] for line in lines]
+            del lines
+            yield fernet_pool.decrypt_many(tokens, self.key)
+
+    def column(self, name: str) -> list:
+        """
+        Decrypt and return every value of one column.
+        """
+        return [v for chunk in self.iter_column(name) for v in chunk]
+
+    def iter_rows(self):
+        """
+        Yield every row decrypted, as lists of values, one chunk of rows at a time.
+        """
+        width = len(self.columns)
+        for first in range(0, self.n_rows, self.chunk_rows):
+            lines = self._read_lines(first, min(first + self.chunk_rows, self.n_rows))
+            plain = fernet_pool.decrypt_many([t for line in lines for t in line.split(b',')], self.key)
+            yield [plain[i * width:(i + 1) * width] for i in range(len(lines))]
+
+    def close(self):
+        self._file.close()
+
+    def rows(self, positions: list, columns: list) -> list:
+        """
+        Decrypt `columns` for the rows at `positions`, one list per row.
+        """
+        idx   = [self.columns.index(col) for col in columns]
+        cells = []
+        for p in positions:
+            line = self._read_lines(p, p + 1)[0].split(b',')
+            cells.extend(line[c] for c in idx)
+        plain = fernet_pool.decrypt_many(cells, self.key)
+        width = len(columns)
+        return [plain[i * width:(i + 1) * width] for i in range(len(positions))]
+
+
+class BlockRoster:
+    """
+    Roster stored in the block format. Only the header is read up front;
+    blobs are read from the (open) file when needed, one column block of
+    one row group at a time, and the last few decrypted blocks are kept.
+    """
+
+    def __init__(self, path: str, key, chunk_rows: int = STREAM_CHUNK_ROWS,
+                 max_cached_blocks: int = MAX_CACHED_BLOCKS):
+        self.key   = key
+        self.max_cached_blocks = max_cached_blocks
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+
+        magic = self._file.read(len(MAGIC) + 4)
+        if not magic.startswith(MAGIC):
+            raise ValueError(f"{path} is not a block-encrypted roster file")
+        (size,) = struct.unpack_from('>I', magic, len(MAGIC))
+        header  = json.loads(self._file.read(size))
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported roster format version: {header['version']}")
+
+        self.columns        = header['columns']
+        self.n_rows         = header['rows']
+        self.row_group_size = header['row_group_size']
+        self.digests        = header.get('digests', [])
+        self.chunk_groups   = max(1, chunk_rows // self.row_group_size)
+
+        # Byte offset of every blob: self._offsets[group, column], plus its length
+        self._lengths = np.array(header['blocks'], dtype=np.int64).reshape(-1, len(self.columns))
+        flat          = self._lengths.ravel()
+        self._offsets = (len(MAGIC) + 4 + size + np.cumsum(flat) - flat).reshape(self._lengths.shape)
+
+        self._blocks = OrderedDict()  # (group, column index) -> decrypted values, LRU order
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def close(self):
+        self._file.close()
+
+    def _read_blob(self, g: int, c: int) -> bytes:
+        """
+        Read the raw blob of row group `g`, column `c` from the file.
+        """
+        with self._lock:
+            self._file.seek(int(self._offsets[g, c]))
+            return self._file.read(int(self._lengths[g, c]))
+
+    def _decrypt_blocks(self, wanted: list) -> list:
+        """
+        Decrypt the (group, column index) blocks in `wanted` and return their values.
+        """
+        tokens = [base64.urlsafe_b64encode(self._read_blob(g, c)) for g, c in wanted]
+        out = []
+        for w, payload in zip(wanted, fernet_pool.decrypt_blobs(tokens, self.key)):
+            values = _unpack(payload, w[0], self.columns[w[1]])
+            expected = min(self.row_group_size, self.n_rows - w[0] * self.row_group_size)
+            if len(values) != expected:
+                raise ValueError(f"Corrupt roster block {w}: expected {expected} values, got {len(values)}")
+            out.append(values)
+        return out
+
+    def _load_blocks(self, wanted: list) -> dict:
+        """
+        Return the decrypted blocks in `wanted`, decrypting those that are
+        not cached and keeping the most recent ones.
+        """
+        with self._lock:
+            found = {w: self._blocks[w] for w in wanted if w in self._blocks}
+            for w in found:
+                self._blocks.move_to_end(w)
+
+        missing = [w for w in wanted if w not in found]
+        if missing:
+            found.update(zip(missing, self._decrypt_blocks(missing)))
+            with self._lock:
+                for w in missing[-self.max_cached_blocks:]:
+                    self._blocks[w] = found[w]
+                while len(self._blocks) > self.max_cached_blocks:
+                    self._blocks.popitem(last=False)
+        return found
+
+    def iter_column(self, name: str):
+        """
+        Yield the decrypted values of one column, a few row groups at a time.
+        Streamed blocks are not kept in the block cache.
+        """
+        c = self.columns.index(name)
+        groups = len(self._lengths)
+        for first in range(0, groups, self.chunk_groups):
+            blocks = self._decrypt_blocks([(g, c) for g in range(first, min(first + self.chunk_groups, groups))])
+            yield [v for values in blocks for v in values]
+
+    def column(self, name: str) -> list:
+        """
+        Decrypt and return every value of one column.
+        """
+        return [v for chunk in self.iter_column(name) for v in chunk]
+
+    def rows(self, positions: list, columns: list) -> list:
+        """
+        Decrypt `columns` for the rows at `positions`, one list per row.
+        Only the row groups containing those rows are decrypted.
+        """
+        idx    = [self.columns.index(col) for col in columns]
+        groups = sorted({p // self.row_group_size for p in positions})
+        blocks = self._load_blocks([(g, c) for g in groups for c in idx])
+
+        rgs = self.row_group_size
+        return [[blocks[(p // rgs, c)][p % rgs] for c in idx] for p in positions]
+
+
+def rotate_csv(path: str, keys, workers: int = None) -> int:
+    """
+    Re-encrypt every cell of an encrypted CSV under keys[0], where each
+    cell may currently be under any of `keys`. The file is streamed a chunk
+    of rows at a time through fernet_pool.rotate_many and swapped in
+    atomically; no plaintext is written anywhere. The `.rowhash` sidecar is
+    removed, since its hashes were keyed with the old key. Returns the
+    number of rows.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+    roster = CsvRoster(path, keys)
+    width  = len(roster.columns)
+
+    def chunks():
+        yield header
+        for first in range(0, roster.n_rows, roster.chunk_rows):
+            lines  = roster._read_lines(first, min(first + roster.chunk_rows, roster.n_rows))
+            tokens = [t for line in lines for t in line.split(b',')]
+            if len(tokens) != width * len(lines):
+                raise ValueError(f"Malformed row between rows {first} and {first + len(lines)} of {path}")
+            fresh = fernet_pool.rotate_many(tokens, keys, workers)
+            yield ''.join(','.join(fresh[i * width:(i + 1) * width]) + '\n' for i in range(len(lines))).encode()
+
+    try:
+        _write_atomic(path, chunks())
+    finally:
+        roster.close()
+    if os.path.exists(path + ROW_HASH_SUFFIX):
+        os.remove(path + ROW_HASH_SUFFIX)
+    return roster.n_rows
+
+
+def rotate_blocks(path: str, keys, workers: int = None) -> int:
+    """
+    Re-encrypt every blob of a block-format roster under keys[0], a few
+    row groups at a time, and swap the file in atomically. Blob sizes do
+    not change; the row group digests are dropped, since they were keyed
+    with the old key. Returns the number of rows.
+    """
+    roster = BlockRoster(path, keys)
+    width  = len(roster.columns)
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'columns': roster.columns,
+        'rows': roster.n_rows,
+        'row_group_size': roster.row_group_size,
+        'blocks': roster._lengths.tolist(),
+    }).encode()
+
+    def chunks():
+        yield MAGIC + struct.pack('>I', len(header)) + header
+        groups = len(roster._lengths)
+        for first in range(0, groups, roster.chunk_groups):
+            wanted = [(g, c) for g in range(first, min(first + roster.chunk_groups, groups)) for c in range(width)]
+            tokens = [base64.urlsafe_b64encode(roster._read_blob(g, c)) for g, c in wanted]
+            for (g, c), token in zip(wanted, fernet_pool.rotate_blobs(tokens, keys, workers)):
+                blob = base64.urlsafe_b64decode(token)
+                if len(blob) != roster._lengths[g, c]:
+                    raise ValueError(f"Rotated block {(g, c)} changed size")
+                yield blob
+
+    try:
+        _write_atomic(path, chunks())
+    finally:
+        roster.close()
+    return roster.n_rows
+
+
+def roster_path(block_path: str = BLOCK_FILE, csv_path: str = LEGACY_CSV) -> str:
+    """
+    Return the block-format roster path if it exists, else the legacy CSV path.
+    """
+    return block_path if os.path.exists(block_path) else csv_path
+
+
+def open_roster(key, block_path: str = BLOCK_FILE, csv_path: str = LEGACY_CSV):
+    """
+    Open the block-format roster if it exists, else fall back to the legacy CSV.
+    """
+    path = roster_path(block_path, csv_path)
+    if path == block_path:
+        return BlockRoster(path, key)
+    return CsvRoster(path, key)
+
+
+def convert_csv(key, csv_path: str = LEGACY_CSV, block_path: str = BLOCK_FILE, workers: int = None):
+    """
+    Convert a legacy per-cell encrypted CSV into the block format.
+    """
+    enc = pd.read_csv(csv_path)
+    write_blocks(fernet_pool.decrypt_frame(enc, key, workers), block_path, key, workers=workers)
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    src = sys.argv[1] if len(sys.argv) > 1 else LEGACY_CSV
+    dst = sys.argv[2] if len(sys.argv) > 2 else BLOCK_FILE
+    convert_csv(fernet_pool.parse_keys(os.getenv('KEY')), src, dst)
+    print(f"Converted {src} ({os.path.getsize(src)} bytes) to {dst} ({os.path.getsize(dst)} bytes).")
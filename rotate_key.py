@@ -0,0 +1,47 @@
+"""
+Rotate the Fernet key of the encrypted roster, without the plaintext.
+
+    OLD_KEY=... NEW_KEY=... python rotate_key.py            # roster in use
+    OLD_KEY=... NEW_KEY=... python rotate_key.py data-encrypted.csv
+
+Steps for a rotation without downtime:
+1. Set KEY="NEW,OLD" wherever the roster is read (Streamlit secrets, the
+   workflow's KEY secret); both keys are accepted.
+2. Run this script and commit the rotated roster.
+3. Set KEY="NEW".
+
+The roster is streamed in chunks through a parallel re-encryption stage
+(FERNET_WORKERS processes) and replaced atomically, so memory use does not
+grow with the roster and readers never see a half-written file.
+"""
+import os
+import time
+import dotenv
+import argparse
+import roster_format
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", help="encrypted roster (default: the one the app reads)")
+    args = parser.parse_args()
+
+    dotenv.load_dotenv()
+    old_key, new_key = os.getenv('OLD_KEY'), os.getenv('NEW_KEY')
+    if not old_key or not new_key:
+        raise EnvironmentError("Set OLD_KEY and NEW_KEY to rotate the roster")
+    keys = (new_key.strip(), old_key.strip())
+
+    path  = args.path or roster_format.roster_path()
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        is_blocks = f.read(len(roster_format.MAGIC)) == roster_format.MAGIC
+    if is_blocks:
+        rows = roster_format.rotate_blocks(path, keys)
+    else:
+        rows = roster_format.rotate_csv(path, keys)
+    print(f"Rotated {rows} rows of {path} to the new key in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()